@@ -4,50 +4,227 @@ LLM Agent with OpenRouter integration.
 Handles conversation, tool calling, and response generation.
 """
 
-import json
+import asyncio
+import contextlib
+import copy
+import importlib.util
 import logging
+import time
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
-from openai import OpenAI
+import httpx
+import orjson
+from openai import AsyncOpenAI
 
+from .cache import SemanticResponseCache, response_scope
 from .config import Config
+from .store import ChromaStore, WriteError
 from .tools import (
-    TOOLS, TOOL_SCHEMAS,
-    _gc_store, GC_ITEM_ID, _compact_gc, _format_gc_for_display
+    TOOL_SCHEMAS, WRITE_TOOLS, dispatch, flush_writes,
+    _items_store, _gc_store, _GC_WRITER, GC_ITEM_ID,
+    _compact_gc, _drop_gc_cache, _format_gc_for_display
 )
 
 logger = logging.getLogger(__name__)
 
 
+_PROMPTS_DIR = Path(__file__).parent / "prompts"
+
+# Marks a prompt cache breakpoint (honored by Anthropic via OpenRouter, ignored elsewhere)
+_CACHE_CONTROL = {"type": "ephemeral"}
+
+# Connection pool shared by all requests made through one client
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+# HTTP/2 multiplexes concurrent requests over one connection; it needs the
+# h2 package (`httpx[http2]`). h2 is not a declared dependency, so standard
+# installs use HTTP/1.1 unless it is installed separately (see README).
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+# How long compacted Global Context is reused across Agent constructions
+_GC_TTL_SECONDS = 1.0
+_gc_lines_cache: tuple[float, list[str]] | None = None
+
+
+@lru_cache(maxsize=None)
+def _read_prompt(name: str) -> str | None:
+    """Read a prompt file once per process. Returns None if it doesn't exist."""
+    path = _PROMPTS_DIR / name
+    if not path.exists():
+        return None
+    return path.read_text()
+
+
 def load_system_prompt() -> str:
-    """Load system prompt from file and inject date/time and Global Context."""
-    prompt_path = Path(__file__).parent / "prompts" / "system.md"
-    if not prompt_path.exists():
+    """
+    Load the static system prompt from file.
+
+    Nothing session-specific is interpolated here, so the prompt is an
+    identical prefix on every request and across sessions, which is what
+    provider-side prompt caching keys on.
+    """
+    prompt = _read_prompt("system.md")
+    if prompt is None:
         return "You are a helpful AI assistant for managing tasks and notes."
 
-    prompt = prompt_path.read_text()
+    return prompt
+
 
-    # Inject date/time
-    today = datetime.now().strftime("%A, %B %d, %Y at %I:%M %p")
-    prompt = prompt.replace("{{today}}", today)
+def _load_compacted_gc_lines() -> list[str]:
+    """Load and compact Global Context, reusing a very recent load."""
+    global _gc_lines_cache
+    now = time.monotonic()
+    if _gc_lines_cache and now - _gc_lines_cache[0] < _GC_TTL_SECONDS:
+        return _gc_lines_cache[1]
 
-    # Load and compact Global Context (removes empty lines from previous session)
-    item = _gc_store.get(GC_ITEM_ID)
+    # Compact removes empty lines left over from the previous session, which
+    # renumbers lines, so the tools' cached lines are dropped (read via the
+    # GC writer so any queued write is seen)
+    _drop_gc_cache()
+    item = _GC_WRITER.submit(_gc_store.get, GC_ITEM_ID).result()
     if item:
-        compacted = _compact_gc(item.content)
-        if compacted != item.content:
-            _gc_store.upsert(GC_ITEM_ID, compacted, {"item_type": "global_context"})
-        lines = compacted.split("\n") if compacted else []
+        content = item.content
+        # Compaction only changes content with blank lines or edge whitespace
+        if "\n\n" in content or content[:1].isspace() or content[-1:].isspace():
+            content = _compact_gc(content)
+            # Persist in the background; the prompt doesn't need to wait
+            _GC_WRITER.submit(
+                _gc_store.upsert, GC_ITEM_ID, content, {"item_type": "global_context"}
+            )
+        lines = content.split("\n") if content else []
     else:
         lines = []
 
+    _gc_lines_cache = (now, lines)
+    return lines
+
+
+def load_session_context() -> str:
+    """Load the session context template and inject date/time and Global Context."""
+    context = _read_prompt("context.md")
+    if context is None:
+        context = "Today is {{today}}.\n\n<global-context>\n{{global_context}}\n</global-context>"
+
+    # Inject date/time, rounded to the hour so sessions started within the
+    # same hour produce an identical block
+    today = datetime.now().strftime("%A, %B %d, %Y at around %I %p").replace(" 0", " ")
+    context = context.replace("{{today}}", today)
+
     # Format and inject Global Context
-    gc_display = _format_gc_for_display(lines)
-    prompt = prompt.replace("{{global_context}}", gc_display)
+    gc_display = _format_gc_for_display(_load_compacted_gc_lines())
+    context = context.replace("{{global_context}}", gc_display)
 
-    return prompt
+    return context
+
+
+# Open clients by (API key, base URL, event loop); see _get_async_client
+_async_clients: dict[tuple[str, str, asyncio.AbstractEventLoop], AsyncOpenAI] = {}
+
+
+def _get_async_client(
+    api_key: str,
+    base_url: str,
+    loop: asyncio.AbstractEventLoop
+) -> AsyncOpenAI:
+    """
+    Get the client for an API key and base URL on an event loop.
+
+    Async connection pools only work on the loop that opened them, so a
+    client is shared per loop: every chat() call of an agent (which reuses
+    one loop) and its chat_batch() forks share warm TCP/TLS connections,
+    but separate agents, each with their own loop, don't. Agent.close()
+    closes the clients of its loop.
+    """
+    key = (api_key, base_url, loop)
+    client = _async_clients.get(key)
+    if client is None:
+        logger.debug("🌐 Opening API client (HTTP/%s)", "2" if _HTTP2 else "1.1, install h2 for HTTP/2")
+        client = _async_clients[key] = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=httpx.AsyncClient(
+                http2=_HTTP2,
+                limits=_HTTP_LIMITS,
+                timeout=_HTTP_TIMEOUT
+            )
+        )
+    return client
+
+
+async def _close_async_clients() -> None:
+    """Close and forget the clients opened on the running event loop."""
+    loop = asyncio.get_running_loop()
+    for key in [key for key in _async_clients if key[2] is loop]:
+        await _async_clients.pop(key).close()
+
+
+def _mark_cacheable(message: dict) -> None:
+    """Put a prompt cache breakpoint on a text message, in place."""
+    message["content"] = [
+        {"type": "text", "text": message["content"], "cache_control": _CACHE_CONTROL}
+    ]
+
+
+def _unmark_cacheable(message: dict) -> None:
+    """Remove a prompt cache breakpoint added by _mark_cacheable, in place."""
+    message["content"] = message["content"][0]["text"]
+
+
+# Index of the first conversation message in Agent._messages; before it are
+# the static system prompt and the session context
+_HISTORY_START = 2
+
+# History bounds: tool exchanges are kept for the most recent user turns
+# only, and whole turns are dropped oldest-first beyond the token budget
+_RECENT_TURNS = 2
+_MAX_HISTORY_TOKENS = 8000
+
+
+def _report_unwritten(results: list[Any], errors: dict[str, Exception]) -> list[Any]:
+    """Replace the results of item creates that failed to write with errors."""
+    return [
+        {"error": f"Item was not saved: {errors[result['id']]}"}
+        if isinstance(result, dict) and result.get("id") in errors else result
+        for result in results
+    ]
+
+
+class _StreamInterrupted(Exception):
+    """
+    Raised by Agent._stream_turn when the stream fails after tool calls ran.
+
+    Carries those calls and their results, so they can be recorded in the
+    history before the original error (the __cause__) is surfaced.
+    """
+
+    def __init__(self, content: str | None, tool_calls: list[dict], results: list[Any]):
+        super().__init__("LLM stream failed after tool calls started")
+        self.content = content
+        self.tool_calls = tool_calls
+        self.results = results
+
+
+def _after_separator(on_text: Callable[[str], None]) -> Callable[[str], None]:
+    """Wrap a text callback so its first text starts on a new paragraph."""
+    started = False
+
+    def emit(text: str) -> None:
+        nonlocal started
+        if not started:
+            started = True
+            text = "\n\n" + text
+        on_text(text)
+
+    return emit
+
+
+def _estimate_tokens(messages: list[dict]) -> int:
+    """Roughly estimate the tokens in a list of messages (~4 bytes per token)."""
+    return len(orjson.dumps(messages)) // 4
 
 
 class Agent:
@@ -65,104 +242,375 @@ class Agent:
             config: Application configuration with API key and model
             base_url: API base URL (defaults to OpenRouter)
         """
-        self._client = OpenAI(
-            api_key=config.openrouter_api_key,
-            base_url=base_url
-        )
+        self._api_key = config.openrouter_api_key
+        self._base_url = base_url
         self._model = config.openrouter_model
         self._system_prompt = load_system_prompt()
-        self._messages: list[dict] = []
+        self._session_context = load_session_context()
 
-    def _build_messages(self) -> list[dict]:
-        """Build full message list with system prompt."""
-        return [
-            {"role": "system", "content": self._system_prompt},
-            *self._messages
+        # Sent to the LLM as-is: ordered static-first, dynamic-last so the
+        # longest possible prefix is shared between requests. Cache
+        # breakpoints sit on the static prompt and on the latest user turn.
+        static_prompt = {"role": "system", "content": self._system_prompt}
+        _mark_cacheable(static_prompt)
+        self._messages: list[dict] = [
+            static_prompt,
+            {"role": "system", "content": self._session_context},
         ]
+        self._cache_tail: dict | None = None
+        self._max_history_tokens = _MAX_HISTORY_TOKENS
+        self._response_cache = None
+        if config.response_cache:
+            self._response_cache = SemanticResponseCache(
+                ChromaStore(collection_name="llm_cache", persist_dir=".data", embed_properties=False)
+            )
+        self._cache_scope = response_scope(self._model, self._system_prompt, self._session_context)
+        # Batch each turn's item adds (see achat); off for concurrent forks
+        self._batch_writes = True
+        # One event loop per agent so the HTTP client's connection pool
+        # survives across chat() calls (asyncio.run would close it)
+        self._runner = asyncio.Runner()
+
+    def _move_cache_breakpoint(self, message: dict) -> None:
+        """Move the rolling conversation cache breakpoint onto a message."""
+        if self._cache_tail is not None:
+            _unmark_cacheable(self._cache_tail)
+        _mark_cacheable(message)
+        self._cache_tail = message
+
+    def _compact_history(self) -> None:
+        """
+        Bound the conversation history that is resent on every LLM call.
+
+        Tool calls and their results from before the last few user turns are
+        dropped, since their outcome is already captured in the assistant's
+        replies. Then, while the history is over the token budget, the oldest
+        turns are dropped whole. The current turn is always kept intact, so
+        tool calls stay paired with their results.
+        """
+        history = self._messages[_HISTORY_START:]
+        user_turns = [i for i, m in enumerate(history) if m["role"] == "user"]
+
+        if len(user_turns) > _RECENT_TURNS:
+            cutoff = user_turns[-_RECENT_TURNS]
+            older = []
+            for message in history[:cutoff]:
+                if message["role"] == "tool":
+                    continue
+                if message.get("tool_calls"):
+                    if not message["content"]:
+                        continue
+                    message = {"role": "assistant", "content": message["content"]}
+                older.append(message)
+            history = older + history[cutoff:]
+
+        while _estimate_tokens(history) > self._max_history_tokens:
+            user_turns = [i for i, m in enumerate(history) if m["role"] == "user"]
+            if len(user_turns) < 2:
+                break
+            history = history[user_turns[1]:]
+
+        self._messages[_HISTORY_START:] = history
 
     def _execute_tool(self, name: str, arguments: dict[str, Any]) -> Any:
         """Execute a tool and return the result."""
-        if name not in TOOLS:
-            return {"error": f"Unknown tool: {name}"}
-
         try:
-            result = TOOLS[name](**arguments)
-            return result
+            return dispatch(name, arguments)
         except Exception as e:
             return {"error": str(e)}
 
-    def chat(self, user_message: str) -> str:
+    async def _stream_turn(
+        self,
+        on_text: Callable[[str], None] | None = None
+    ) -> tuple[str | None, list[dict], list[Any]]:
+        """
+        Stream one LLM response, dispatching tool calls as they complete.
+
+        Each tool call starts executing (in a worker thread) as soon as its
+        arguments have fully arrived, instead of waiting for the whole
+        response. Tool calls stream in order, so a call is complete once its
+        arguments parse or the next call begins.
+
+        Args:
+            on_text: Optional callback receiving text deltas as they arrive
+
+        Returns:
+            Tuple of (content, tool_calls in history format, tool results)
+
+        Raises:
+            _StreamInterrupted: If the stream fails after tool calls started
+                (other stream errors propagate as they are)
+        """
+        client = _get_async_client(self._api_key, self._base_url, asyncio.get_running_loop())
+        stream = await client.chat.completions.create(
+            model=self._model,
+            messages=self._messages,
+            tools=TOOL_SCHEMAS,
+            stream=True
+        )
+
+        content_parts: list[str] = []
+        calls: dict[int, dict] = {}
+        tasks: dict[int, asyncio.Task] = {}
+        # Parsed arguments by raw JSON, for repeated identical calls this turn
+        parsed: dict[str, dict[str, Any]] = {}
+
+        def parse(raw: str) -> dict[str, Any]:
+            arguments = parsed.get(raw)
+            if arguments is None:
+                arguments = parsed[raw] = orjson.loads(raw)
+            return arguments
+
+        def dispatch(index: int, arguments: dict[str, Any]) -> None:
+            name = calls[index]["function"]["name"]
+            tasks[index] = asyncio.create_task(
+                asyncio.to_thread(self._execute_tool, name, arguments)
+            )
+
+        def dispatch_pending() -> None:
+            for index, call in calls.items():
+                if index not in tasks:
+                    try:
+                        arguments = parse(call["function"]["arguments"])
+                    except orjson.JSONDecodeError:
+                        arguments = {}  # Bad JSON: call with no arguments
+                    dispatch(index, arguments)
+
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+
+                if delta.content:
+                    content_parts.append(delta.content)
+                    if on_text:
+                        on_text(delta.content)
+
+                for tc in delta.tool_calls or []:
+                    if tc.index not in calls:
+                        # A new call starting means all earlier ones are complete
+                        dispatch_pending()
+                        calls[tc.index] = {
+                            "id": tc.id,
+                            "type": "function",
+                            "function": {"name": "", "arguments": ""}
+                        }
+                    call = calls[tc.index]
+                    if tc.id:
+                        call["id"] = tc.id
+                    if tc.function and tc.function.name:
+                        call["function"]["name"] = tc.function.name
+                    if tc.function and tc.function.arguments:
+                        call["function"]["arguments"] += tc.function.arguments
+                        raw = call["function"]["arguments"]
+                        if tc.index not in tasks and raw.rstrip().endswith("}"):
+                            try:
+                                dispatch(tc.index, parse(raw))
+                            except orjson.JSONDecodeError:
+                                pass  # Not complete yet
+
+            dispatch_pending()
+        except Exception as e:
+            if not tasks:
+                raise
+            # Tools that already started may have written data, so let them
+            # finish and hand back what ran, for the history to record it
+            order = sorted(tasks)
+            results = await asyncio.gather(*(tasks[index] for index in order), return_exceptions=True)
+            results = [
+                {"error": str(result) or type(result).__name__}
+                if isinstance(result, BaseException) else result
+                for result in results
+            ]
+            content = "".join(content_parts) or None
+            raise _StreamInterrupted(content, [calls[index] for index in order], results) from e
+
+        order = sorted(calls)
+        results = await asyncio.gather(*(tasks[index] for index in order))
+        content = "".join(content_parts) or None
+        return content, [calls[index] for index in order], list(results)
+
+    async def achat(
+        self,
+        user_message: str,
+        on_text: Callable[[str], None] | None = None
+    ) -> str:
         """
         Process a user message and return the assistant's response.
 
         Handles tool calls automatically in a loop until the assistant
-        provides a final text response.
+        provides a final text response. Responses are streamed so tool calls
+        start while the LLM is still generating, and run concurrently. If a
+        stream fails partway through, calls that already ran stay in the
+        history with their results (their writes happened), and the stream's
+        error is raised.
 
         Args:
             user_message: The user's input
+            on_text: Optional callback receiving response text as it streams
+                in, for showing output before the response completes. Text
+                from each LLM call (e.g. narration before tool calls) is
+                separated from the previous call's by a blank line.
 
         Returns:
             The assistant's text response
         """
+        # Only an opening question can be answered from cache; later turns
+        # depend on the conversation so far
+        use_cache = self._response_cache is not None and len(self._messages) == _HISTORY_START
+        if use_cache:
+            cached = self._response_cache.get(user_message, self._cache_scope)
+            if cached is not None:
+                self._messages.append({"role": "user", "content": user_message})
+                self._messages.append({"role": "assistant", "content": cached})
+                if on_text:
+                    on_text(cached)
+                return cached
+
         # Add user message to history
-        self._messages.append({"role": "user", "content": user_message})
+        message = {"role": "user", "content": user_message}
+        self._move_cache_breakpoint(message)
+        self._messages.append(message)
+        wrote = False
+        turn_on_text = on_text
+        streamed = False
 
         while True:
-            # Call the LLM
-            response = self._client.chat.completions.create(
-                model=self._model,
-                messages=self._build_messages(),
-                tools=TOOL_SCHEMAS,
-                tool_choice="auto"
-            )
+            self._compact_history()
 
-            message = response.choices[0].message
-            logger.debug(f"💬 LLM response: tool_calls={bool(message.tool_calls)}")
+            # Call the LLM (tools run while it streams); item writes from
+            # this turn's tools are batched into one Chroma call, made before
+            # any result goes back to the LLM
+            batch = _items_store if self._batch_writes else contextlib.nullcontext()
+            interrupted = None
+            try:
+                with batch:
+                    try:
+                        content, tool_calls, results = await self._stream_turn(turn_on_text)
+                    except _StreamInterrupted as e:
+                        interrupted = e
+                        content, tool_calls, results = e.content, e.tool_calls, e.results
+            except WriteError as e:
+                # Raised on leaving the block, so the turn's results are set
+                results = _report_unwritten(results, e.errors)
+            logger.debug("💬 LLM response: tool_calls=%s", bool(tool_calls))
 
             # Check if we're done (no tool calls)
-            if not message.tool_calls:
+            if not tool_calls:
                 # Add assistant response to history
                 self._messages.append({
                     "role": "assistant",
-                    "content": message.content
+                    "content": content
                 })
-                return message.content or ""
+                if use_cache and content and not wrote:
+                    self._response_cache.put(user_message, self._cache_scope, content)
+                return content or ""
+
+            # Keep the next call's text from running into narration already shown
+            streamed = streamed or bool(content)
+            if on_text and streamed:
+                turn_on_text = _after_separator(on_text)
 
-            # Process tool calls
             # Add assistant message with tool calls to history
             self._messages.append({
                 "role": "assistant",
-                "content": message.content,
-                "tool_calls": [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments
-                        }
-                    }
-                    for tc in message.tool_calls
-                ]
+                "content": content,
+                "tool_calls": tool_calls
             })
 
-            # Execute each tool call and add results
-            for tool_call in message.tool_calls:
-                name = tool_call.function.name
-                try:
-                    arguments = json.loads(tool_call.function.arguments)
-                except json.JSONDecodeError:
-                    arguments = {}
+            # Add tool results to history in the original tool_call order
+            for tool_call, result in zip(tool_calls, results):
+                message = {
+                    "role": "tool",
+                    "tool_call_id": tool_call["id"],
+                    "content": orjson.dumps(result).decode()
+                }
+                self._messages.append(message)
 
-                result = self._execute_tool(name, arguments)
+            # Everything up to the last tool result is final, so the next
+            # request can reuse it from the provider's prompt cache
+            self._move_cache_breakpoint(message)
 
-                # Add tool result to history
-                self._messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": json.dumps(result)
-                })
+            # Stored data changed, so cached answers may no longer be true
+            if any(call["function"]["name"] in WRITE_TOOLS for call in tool_calls):
+                wrote = True
+                if self._response_cache is not None:
+                    self._response_cache.clear()
+
+            # The calls that ran are recorded, so the next turn knows about
+            # their writes; now surface the stream's error
+            if interrupted is not None:
+                raise interrupted.__cause__
+
+    def chat(
+        self,
+        user_message: str,
+        on_text: Callable[[str], None] | None = None
+    ) -> str:
+        """Synchronous wrapper around achat() for the CLI and other sync callers."""
+        return self._runner.run(self.achat(user_message, on_text))
+
+    def _fork(self) -> "Agent":
+        """
+        Create an agent with a fresh conversation that shares this one's
+        prompts, HTTP client, response cache and event loop.
+        """
+        fork = copy.copy(self)
+        fork._messages = self._messages[:_HISTORY_START]
+        fork._cache_tail = None
+        # Forks run concurrently, and overlapping batches on the shared store
+        # would only be written (and fail) when the last one ends, so each
+        # add is written as its tool runs
+        fork._batch_writes = False
+        return fork
+
+    async def achat_batch(self, prompts: list[str], concurrency: int = 16) -> list[str]:
+        """
+        Answer many independent prompts concurrently.
+
+        Each prompt runs as its own single-turn conversation, so they don't
+        see each other's history (or this agent's). Useful for evaluations
+        and bulk jobs, where throughput is bound by API latency.
+
+        Args:
+            prompts: User messages, one per conversation
+            concurrency: Maximum number of conversations in flight
+
+        Returns:
+            The assistant's responses, in the same order as prompts
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        done = 0
+
+        async def run_one(prompt: str) -> str:
+            nonlocal done
+            async with semaphore:
+                response = await self._fork().achat(prompt)
+            done += 1
+            logger.info("📦 Batch progress: %d/%d", done, len(prompts))
+            return response
+
+        return await asyncio.gather(*(run_one(prompt) for prompt in prompts))
+
+    def chat_batch(self, prompts: list[str], concurrency: int = 16) -> list[str]:
+        """Synchronous wrapper around achat_batch()."""
+        return self._runner.run(self.achat_batch(prompts, concurrency))
 
     def reset(self) -> None:
         """Clear conversation history."""
-        self._messages = []
+        del self._messages[_HISTORY_START:]
+        self._cache_tail = None
+
+    def close(self) -> None:
+        """
+        Write any queued item adds, then close the agent's HTTP clients and
+        event loop (even if the write fails).
+        """
+        try:
+            flush_writes()
+        finally:
+            try:
+                self._runner.run(_close_async_clients())
+            finally:
+                self._runner.close()
@@ -0,0 +1,183 @@
+"""
+Semantic caches.
+
+SemanticResponseCache answers a prompt from a previous response when it means
+the same thing as one already answered, skipping the LLM round-trip entirely.
+SemanticQueryCache does the same for item searches, in memory.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+import orjson
+
+from .store import ChromaStore
+
+logger = logging.getLogger(__name__)
+
+# Cosine distance at or below which two prompts count as the same question
+# (i.e. cosine similarity >= 0.92)
+DEFAULT_MAX_DISTANCE = 0.08
+
+# Cosine similarity at or above which two searches count as the same search
+DEFAULT_MIN_QUERY_SIMILARITY = 0.97
+DEFAULT_QUERY_CACHE_SIZE = 512
+
+
+def response_scope(model: str, *prompts: str) -> str:
+    """
+    Build the scope key for responses produced by a model under given prompts.
+
+    Cached responses are only reused within the same scope, so changing the
+    model, the instructions, the date or the Global Context starts fresh.
+    """
+    digest = hashlib.sha256("\0".join(prompts).encode()).hexdigest()[:16]
+    return f"{model}:{digest}"
+
+
+class SemanticResponseCache:
+    """Caches final assistant responses keyed by the meaning of the prompt."""
+
+    def __init__(self, store: ChromaStore, max_distance: float = DEFAULT_MAX_DISTANCE):
+        """
+        Initialize the cache.
+
+        Args:
+            store: Store for cached prompts (should not embed properties,
+                since the response is payload, not meaning)
+            max_distance: Maximum cosine distance for a prompt to count as a hit
+        """
+        self._store = store
+        self._max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, prompt: str, scope: str) -> str | None:
+        """Return the cached response for a semantically equivalent prompt, if any."""
+        match = self._store.nearest(prompt, where={"scope": scope})
+        if match and match[1] <= self._max_distance:
+            self.hits += 1
+            logger.debug("🎯 Response cache hit (distance=%.3f)", match[1])
+            return match[0].metadata["response"]
+
+        self.misses += 1
+        return None
+
+    def put(self, prompt: str, scope: str, response: str) -> None:
+        """Cache a response for a prompt."""
+        self._store.add(prompt, {"scope": scope, "response": response})
+
+    def clear(self) -> None:
+        """Drop all cached responses (stored data changed, so they may be stale)."""
+        self._store.clear()
+
+
+class SemanticQueryCache:
+    """
+    In-memory LRU cache of search results keyed by query embedding.
+
+    A search hits when its filter and limit match a cached one exactly and
+    its embedding is close enough to that one's. Clear it whenever the
+    searched data changes.
+    """
+
+    def __init__(
+        self,
+        min_similarity: float = DEFAULT_MIN_QUERY_SIMILARITY,
+        max_entries: int = DEFAULT_QUERY_CACHE_SIZE
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            min_similarity: Minimum cosine similarity for a search to count as a hit
+            max_entries: Number of searches kept before evicting the oldest
+        """
+        self._min_similarity = min_similarity
+        self._max_entries = max_entries
+        self._entries: OrderedDict[int, tuple[bytes, np.ndarray, Any]] = OrderedDict()
+        # Per filter: entry keys and their unit embeddings stacked as rows,
+        # rebuilt on the next lookup after that filter's entries change
+        self._matrices: dict[bytes, tuple[list[int], np.ndarray]] = {}
+        self._next_key = 0
+        self._lock = threading.Lock()
+        # Bumped by clear(), so results computed before a write aren't cached after it
+        self.generation = 0
+
+    @staticmethod
+    def _filter_key(where: dict | None, limit: int) -> bytes:
+        return orjson.dumps([where, limit], option=orjson.OPT_SORT_KEYS)
+
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32)
+        return embedding / (np.linalg.norm(embedding) or 1.0)
+
+    def _matrix(self, filter_key: bytes) -> tuple[list[int], np.ndarray] | None:
+        """Get the stacked embeddings for a filter (hold self._lock)."""
+        matrix = self._matrices.get(filter_key)
+        if matrix is None:
+            keys = [key for key, entry in self._entries.items() if entry[0] == filter_key]
+            if not keys:
+                return None
+            vectors = np.stack([self._entries[key][1] for key in keys])
+            matrix = self._matrices[filter_key] = (keys, vectors)
+        return matrix
+
+    def get(self, embedding: np.ndarray, where: dict | None, limit: int) -> Any | None:
+        """Return cached results for an equivalent search, if any."""
+        filter_key = self._filter_key(where, limit)
+        unit = self._unit(embedding)
+
+        with self._lock:
+            matrix = self._matrix(filter_key)
+            if matrix is None:
+                return None
+            # Rows are unit vectors, so one matrix-vector product gives cosines
+            keys, vectors = matrix
+            similarities = vectors @ unit
+            best = int(similarities.argmax())
+            if similarities[best] < self._min_similarity:
+                return None
+            key = keys[best]
+            self._entries.move_to_end(key)
+            logger.debug("🎯 Query cache hit (similarity=%.3f)", similarities[best])
+            return self._entries[key][2]
+
+    def put(
+        self,
+        embedding: np.ndarray,
+        where: dict | None,
+        limit: int,
+        results: Any,
+        generation: int
+    ) -> None:
+        """
+        Cache results for a search.
+
+        Args:
+            generation: Value of self.generation when the search started; the
+                results are dropped if the cache was cleared since
+        """
+        filter_key = self._filter_key(where, limit)
+        unit = self._unit(embedding)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[self._next_key] = (filter_key, unit, results)
+            self._next_key += 1
+            self._matrices.pop(filter_key, None)
+            if len(self._entries) > self._max_entries:
+                _, (evicted_filter_key, _, _) = self._entries.popitem(last=False)
+                self._matrices.pop(evicted_filter_key, None)
+
+    def clear(self) -> None:
+        """Drop all cached results."""
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+            self.generation += 1
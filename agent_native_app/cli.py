@@ -15,7 +15,14 @@ def main(config: Config):
     print()
 
     agent = Agent(config)
+    try:
+        _repl(agent)
+    finally:
+        agent.close()
 
+
+def _repl(agent: Agent):
+    """Read user input and dispatch commands until the user quits."""
     while True:
         try:
             user_input = input("You: ").strip()
@@ -50,10 +57,11 @@ Examples:
 """)
             continue
 
-        # Get response from agent
+        # Get response from agent, printing text as it streams in
+        print("\nAssistant: ", end="", flush=True)
         try:
-            response = agent.chat(user_input)
-            print(f"\nAssistant: {response}\n")
+            agent.chat(user_input, on_text=lambda text: print(text, end="", flush=True))
+            print("\n")
         except Exception as e:
             print(f"\nError: {e}\n")
 
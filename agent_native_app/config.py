@@ -7,6 +7,7 @@ Loads environment variables from .env and validates required settings.
 import logging
 import os
 from dataclasses import dataclass
+from functools import lru_cache
 
 from dotenv import load_dotenv
 
@@ -19,6 +20,9 @@ LOG_LEVELS = {
     "CRITICAL": logging.CRITICAL,
 }
 
+# Accepted spellings for true boolean values
+_TRUTHY = frozenset(("true", "1", "yes", "on"))
+
 
 class ConfigError(Exception):
     """Raised when required configuration is missing or invalid."""
@@ -26,7 +30,7 @@ class ConfigError(Exception):
     pass
 
 
-@dataclass
+@dataclass(frozen=True)
 class Config:
     """Application configuration."""
 
@@ -36,13 +40,32 @@ class Config:
     log_level_deps: int
     log_to_console: bool
     log_file_path: str | None
+    response_cache: bool = False
+
+
+def _parse_log_level(raw: str | None, default: int) -> int:
+    """Parse a log level name, falling back to default when unset or unknown."""
+    if not raw:
+        return default
+    return LOG_LEVELS.get(raw.strip().upper(), default)
 
 
+def _parse_bool(raw: str | None, default: bool) -> bool:
+    """Parse a boolean value, falling back to default when unset or blank."""
+    raw = (raw or "").strip()
+    if not raw:
+        return default
+    return raw.lower() in _TRUTHY
+
+
+@lru_cache(maxsize=1)
 def load_config() -> Config:
     """
     Load configuration from environment variables.
 
-    Loads .env file if present, then validates required variables.
+    Loads .env file if present, then validates required variables. The
+    result is cached, since Config is immutable; call
+    load_config.cache_clear() to re-read the environment.
 
     Returns:
         Config object with validated settings
@@ -56,17 +79,14 @@ def load_config() -> Config:
     model = os.getenv("OPENROUTER_MODEL", "").strip()
 
     # Parse log levels (default to DEBUG for app, INFO for deps)
-    log_level_app_str = os.getenv("LOG_LEVEL_APP", "").strip().upper()
-    log_level_app = LOG_LEVELS.get(log_level_app_str, logging.DEBUG)
-
-    log_level_deps_str = os.getenv("LOG_LEVEL_DEPS", "").strip().upper()
-    log_level_deps = LOG_LEVELS.get(log_level_deps_str, logging.INFO)
+    log_level_app = _parse_log_level(os.getenv("LOG_LEVEL_APP"), logging.DEBUG)
+    log_level_deps = _parse_log_level(os.getenv("LOG_LEVEL_DEPS"), logging.INFO)
 
-    # Parse boolean (default to True)
-    log_to_console_str = os.getenv("LOG_TO_CONSOLE", "").strip().lower()
-    log_to_console = log_to_console_str in ("true", "1", "yes", "on") if log_to_console_str else True
+    # Parse booleans (console logging on, response cache opt-in)
+    log_to_console = _parse_bool(os.getenv("LOG_TO_CONSOLE"), True)
+    response_cache = _parse_bool(os.getenv("RESPONSE_CACHE"), False)
 
-    log_file_path = os.getenv("LOG_FILE_PATH", "").strip() or None
+    log_file_path = (os.getenv("LOG_FILE_PATH") or "").strip() or None
 
     errors = []
 
@@ -90,4 +110,5 @@ def load_config() -> Config:
         log_level_deps=log_level_deps,
         log_to_console=log_to_console,
         log_file_path=log_file_path,
+        response_cache=response_cache,
     )
@@ -5,37 +5,143 @@ Provides a protocol for persistence operations and a ChromaDB implementation.
 The abstraction allows swapping storage backends without changing tool or agent code.
 """
 
+import logging
+import os
+import threading
+import time
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Protocol
-from uuid import uuid4
+from uuid import UUID
 
 import chromadb
+import numpy as np
+from chromadb.api.types import (
+    DefaultEmbeddingFunction,
+    Documents,
+    EmbeddingFunction,
+    Embeddings,
+    validate_metadata,
+)
 from chromadb.config import Settings
+from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+
+logger = logging.getLogger(__name__)
 
 # Internal metadata keys excluded from user-facing metadata
-_INTERNAL_KEYS = {"created_at", "updated_at"}
+_INTERNAL_KEYS = frozenset({"created_at", "updated_at", "_raw_content"})
 
 # Property embedding constants
 _PROPS_DELIMITER = "\n---ANA_PROPS---\n"
-_DATE_KEY_SUFFIXES = ("_date", "_at", "_time", "_due", "_deadline")
-_DATE_KEY_NAMES = frozenset(("due", "deadline", "scheduled", "start", "end"))
+# Date-like keys (lowercased): one of a few exact names, or a name ending in
+# "_" plus one of these suffixes
+_DATE_KEY_NAMES = frozenset({"due", "deadline", "scheduled", "start", "end"})
+_DATE_KEY_SUFFIXES = frozenset({"date", "at", "time", "due", "deadline"})
+
+# English names for embedded date values, indexed directly rather than
+# going through strftime's locale-dependent %A/%B
+_WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+_MONTHS = (
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+)
+
+# Last (second, ISO timestamp) handed out by ChromaStore._now(); a single
+# tuple so concurrent writers always see a matching pair
+_now_cache: tuple[int, str] = (0, "")
+
+try:
+    from uuid import uuid7  # Python 3.14+
+except ImportError:
+    def uuid7() -> UUID:
+        """
+        Generate a time-ordered UUID version 7 (RFC 9562).
+
+        48 bits of Unix milliseconds, then the version and variant, with the
+        rest random.
+        """
+        rand = int.from_bytes(os.urandom(10))
+        value = (
+            (time.time_ns() // 1_000_000) << 80
+            | 0x7 << 76
+            | (rand >> 68) << 64
+            | 0b10 << 62
+            | rand & ((1 << 62) - 1)
+        )
+        return UUID(int=value)
+
+
+class _SharedDefaultEmbedding(DefaultEmbeddingFunction):
+    """
+    Chroma's default embedding function, loading its ONNX model only once.
+
+    The stock version builds (and loads) a fresh model on every call. This one
+    keeps the same name and config, so existing collections accept it. Chroma
+    won't call a DefaultEmbeddingFunction given to a collection (it falls back
+    to the stock one), so ChromaStore computes vectors with it and passes them
+    to Chroma explicitly.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._model: ONNXMiniLM_L6_V2 | None = None
+
+    def __call__(self, input: Documents) -> Embeddings:
+        if self._model is None:
+            self._model = ONNXMiniLM_L6_V2()
+        return self._model(input)
+
+
+# Shared by all stores unless one is given its own
+_EMBEDDING_FUNCTION = _SharedDefaultEmbedding()
+
+# Pending adds that trigger an early flush while batching (Chroma's per-call
+# overhead is amortized well before this)
+_MAX_BATCH_SIZE = 100
+
+
+class WriteError(Exception):
+    """Raised when queued adds could not be written. They are dropped, not retried."""
+
+    def __init__(self, errors: dict[str, Exception]):
+        """
+        Args:
+            errors: The error for each item id that failed
+        """
+        super().__init__("; ".join(f"{item_id}: {error}" for item_id, error in errors.items()))
+        self.errors = errors
+
+
+@lru_cache(maxsize=None)
+def _client(persist_dir: str) -> chromadb.ClientAPI:
+    """Open the Chroma database at persist_dir once, shared by every store on it."""
+    return chromadb.PersistentClient(
+        path=persist_dir,
+        settings=Settings(anonymized_telemetry=False)
+    )
 
 
 def _filter_metadata(metadata: dict) -> dict:
     """Remove internal keys from metadata for user-facing output."""
-    return {k: v for k, v in metadata.items() if k not in _INTERNAL_KEYS}
+    # Copy-and-pop beats rebuilding the dict: there are only a few internal keys
+    filtered = dict(metadata)
+    for key in _INTERNAL_KEYS:
+        filtered.pop(key, None)
+    return filtered
 
 
+@lru_cache(maxsize=256)
 def _is_date_key(key: str) -> bool:
-    """Check if a key name suggests it contains a date value."""
-    key_lower = key.lower()
-    return (
-        any(key_lower.endswith(suffix) for suffix in _DATE_KEY_SUFFIXES)
-        or key_lower in _DATE_KEY_NAMES
-    )
+    """Check if a key name suggests it contains a date value (memoized: few distinct keys)."""
+    key = key.lower()
+    if key in _DATE_KEY_NAMES:
+        return True
+    _, sep, suffix = key.rpartition("_")
+    return bool(sep) and suffix in _DATE_KEY_SUFFIXES
 
 
+@lru_cache(maxsize=2048)
 def _format_date_value(value: str) -> str:
     """
     Convert ISO date/datetime to human-readable format.
@@ -44,20 +150,27 @@ def _format_date_value(value: str) -> str:
         '2026-01-13' -> 'Monday January 13 2026'
         '2026-01-13T14:30:00' -> 'Monday January 13 2026 at 2:30 PM'
 
-    Returns original value if not a recognizable date format.
+    Returns original value if not a recognizable date format. Memoized, since
+    the same dates recur across items and the function is pure.
     """
-    # Try ISO date: YYYY-MM-DD
     try:
-        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
-        if "T" in value:
-            # Has time component
-            return dt.strftime("%A %B %d %Y at %-I:%M %p").replace(" 0", " ")
-        else:
-            # Date only
-            return dt.strftime("%A %B %d %Y").replace(" 0", " ")
-    except (ValueError, AttributeError):
+        # Cheap reject for plain values ("active", "3", ...) so they never
+        # reach the parser and its exception path
+        if len(value) < 10 or value[4:5] != "-" or value[7:8] != "-":
+            return value
+        iso = value[:-1] + "+00:00" if value.endswith("Z") else value
+        dt = datetime.fromisoformat(iso)
+    except (ValueError, TypeError, AttributeError):
+        # Not a date, or not a string at all
         return value
 
+    formatted = f"{_WEEKDAYS[dt.weekday()]} {_MONTHS[dt.month - 1]} {dt.day} {dt.year}"
+    # Has time component, or date only
+    if "T" in value:
+        hour = (dt.hour - 1) % 12 + 1
+        formatted += f" at {hour}:{dt.minute:02d} {'AM' if dt.hour < 12 else 'PM'}"
+    return formatted
+
 
 def _embed_properties(content: str, metadata: dict | None) -> str:
     """
@@ -71,26 +184,19 @@ def _embed_properties(content: str, metadata: dict | None) -> str:
         metadata: Properties to embed (internal keys excluded)
 
     Returns:
-        Content with properties appended after delimiter, or original if no props.
+        Content with properties appended after delimiter, or original if no
+        props or if content already has embedded props.
     """
-    if not metadata:
+    if not metadata or metadata.keys() <= _INTERNAL_KEYS or _PROPS_DELIMITER in content:
         return content
 
-    # Filter out internal keys
-    props = {k: v for k, v in metadata.items() if k not in _INTERNAL_KEYS}
-    if not props:
-        return content
-
-    # Format each property, converting dates to human-readable
-    lines = []
-    for key, value in props.items():
-        if _is_date_key(key) and isinstance(value, str):
-            formatted_value = _format_date_value(value)
-        else:
-            formatted_value = value
-        # Convert snake_case to readable format
-        readable_key = key.replace("_", " ")
-        lines.append(f"{readable_key}: {formatted_value}")
+    # One pass over user keys: snake_case made readable, dates made human-readable
+    lines = [
+        f"{key.replace('_', ' ')}: "
+        f"{_format_date_value(value) if isinstance(value, str) and _is_date_key(key) else value}"
+        for key, value in metadata.items()
+        if key not in _INTERNAL_KEYS
+    ]
 
     return content + _PROPS_DELIMITER + "\n".join(lines)
 
@@ -105,13 +211,11 @@ def _strip_properties(stored_content: str) -> str:
     Returns:
         Original content without the properties section.
     """
-    if _PROPS_DELIMITER not in stored_content:
-        return stored_content
-
-    return stored_content.split(_PROPS_DELIMITER, 1)[0]
+    # One scan, no list; the whole string comes back when there's no delimiter
+    return stored_content.partition(_PROPS_DELIMITER)[0]
 
 
-@dataclass
+@dataclass(slots=True)
 class Item:
     """A stored item with content and arbitrary metadata."""
     id: str
@@ -160,36 +264,197 @@ class Store(Protocol):
         """
         ...
 
+    def query_columnar(
+        self,
+        text: str | None = None,
+        where: dict | None = None,
+        limit: int = 10
+    ) -> dict[str, list]:
+        """
+        Like query(), but return results as parallel lists instead of Items.
+
+        Returns:
+            Dict with "ids", "contents", "metadatas", "created_at" and
+            "updated_at" lists, one entry per result.
+        """
+        ...
+
+    def flush(self) -> None:
+        """Write any adds the store has queued (a no-op for unbatched stores)."""
+        ...
+
 
 class ChromaStore:
-    """ChromaDB implementation of the Store protocol."""
+    """
+    ChromaDB implementation of the Store protocol.
+
+    Use the store as a context manager to batch writes: inside a `with store:`
+    block, add() queues items and they are written (and embedded) in a single
+    Chroma call when the block exits, the queue fills up, or any other
+    operation needs to see them. Adds that fail to write during the block are
+    all raised as one WriteError when it exits, so callers learn about them
+    in one place rather than from whichever read happened to flush.
+    """
 
-    def __init__(self, collection_name: str = "items", persist_dir: str = ".data"):
+    def __init__(
+        self,
+        collection_name: str = "items",
+        persist_dir: str = ".data",
+        embed_properties: bool = True,
+        embedding_function: EmbeddingFunction | None = None
+    ):
         """
         Initialize ChromaDB store.
 
         Args:
             collection_name: Name of the collection (e.g., "items", "memory")
             persist_dir: Directory for persistent storage
+            embed_properties: Whether to embed metadata into documents for
+                semantic search (disable when metadata is payload, not meaning)
+            embedding_function: Embedding model for documents and queries
+                (defaults to Chroma's default model, loaded once and shared
+                by every store)
         """
-        self._client = chromadb.PersistentClient(
-            path=persist_dir,
-            settings=Settings(anonymized_telemetry=False)
-        )
+        self._embed_props = embed_properties
+        self._embedding_function = embedding_function or _EMBEDDING_FUNCTION
+
+        # Write batching state (see class docstring)
+        self._batch_lock = threading.RLock()
+        self._batch_depth = 0
+        self._pending: list[tuple[str, str, dict]] = []
+        self._write_errors: dict[str, Exception] = {}
+        self._client = _client(persist_dir)
         self._collection = self._client.get_or_create_collection(
             name=collection_name,
-            metadata={"hnsw:space": "cosine"}
+            metadata={"hnsw:space": "cosine"},
+            embedding_function=self._embedding_function
         )
 
+    def __enter__(self) -> "ChromaStore":
+        """Start batching adds."""
+        with self._batch_lock:
+            self._batch_depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """
+        Stop batching; writes queued adds once the outermost block exits.
+
+        Raises:
+            WriteError: For every add in the block that could not be written
+                (logged instead if the block itself raised)
+        """
+        with self._batch_lock:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                try:
+                    self.flush()
+                except WriteError as e:
+                    if exc_type is None:
+                        raise
+                    logger.error("Batched adds were not written: %s", e)
+
+    def flush(self) -> None:
+        """
+        Write all queued adds in one batched call.
+
+        If Chroma rejects the batch, each add is retried on its own, so one
+        bad item doesn't lose the others. Adds stay queued until written.
+
+        Raises:
+            WriteError: For the adds that failed on their own (after the rest
+                were written); they are dropped from the queue. Inside a
+                batch, errors are held until the batch exits.
+        """
+        with self._batch_lock:
+            if self._pending:
+                self._write_pending()
+            if self._write_errors and not self._batch_depth:
+                errors, self._write_errors = self._write_errors, {}
+                raise WriteError(errors)
+
+    def _write_pending(self) -> None:
+        """Write queued adds, recording the ones that fail (hold self._batch_lock)."""
+        batch = list(self._pending)
+        ids, documents, metadatas = zip(*batch)
+        try:
+            self._collection.add(
+                ids=list(ids),
+                documents=list(documents),
+                embeddings=self._embed_documents(list(documents)),
+                metadatas=list(metadatas)
+            )
+        except Exception as e:
+            if len(batch) == 1:
+                del self._pending[0]
+                self._write_errors[ids[0]] = e
+                return
+            for item_id, document, metadata in batch:
+                try:
+                    self._collection.add(
+                        ids=[item_id],
+                        documents=[document],
+                        embeddings=self._embed_documents([document]),
+                        metadatas=[metadata]
+                    )
+                except Exception as item_error:
+                    self._write_errors[item_id] = item_error
+                del self._pending[0]
+        else:
+            del self._pending[:len(batch)]
+
+    def _embed_documents(self, documents: list[str]) -> Embeddings:
+        """Embed documents with this store's model, for passing to Chroma."""
+        return self._embedding_function(documents)
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a query text the same way query() would."""
+        return np.asarray(self._embedding_function([text])[0], dtype=np.float32)
+
     def _now(self) -> str:
-        """Get current UTC timestamp as ISO string."""
-        return datetime.now(timezone.utc).isoformat()
+        """
+        Get current UTC timestamp as ISO string, at second precision.
+
+        A burst of writes within one second reuses the same string instead of
+        reading the clock into a datetime and formatting it each time.
+        """
+        global _now_cache
+        second = int(time.time())
+        cached_second, timestamp = _now_cache
+        if second != cached_second:
+            timestamp = datetime.fromtimestamp(second, timezone.utc).isoformat()
+            _now_cache = (second, timestamp)
+        return timestamp
+
+    def _stored_content(self, content: str, metadata: dict | None, full_metadata: dict) -> str:
+        """
+        Build the document to store, embedding properties if enabled.
+
+        When properties are embedded, the original content is also kept in
+        full_metadata["_raw_content"] so reads can return it without scanning
+        the document for the delimiter.
+        """
+        stored_content = _embed_properties(content, metadata) if self._embed_props else content
+        if stored_content is content:
+            full_metadata.pop("_raw_content", None)
+        else:
+            full_metadata["_raw_content"] = content
+        return stored_content
+
+    @staticmethod
+    def _item_content(document: str, metadata: dict) -> str:
+        """Get an item's original content from its stored document."""
+        # Rows written before _raw_content existed fall back to stripping
+        content = metadata.get("_raw_content")
+        if content is None:
+            content = _strip_properties(document)
+        return content
 
     def _result_to_item(self, id: str, document: str, metadata: dict) -> Item:
         """Convert ChromaDB result to Item, stripping embedded properties."""
         return Item(
             id=id,
-            content=_strip_properties(document),
+            content=self._item_content(document, metadata),
             metadata=_filter_metadata(metadata),
             created_at=metadata.get("created_at", ""),
             updated_at=metadata.get("updated_at", "")
@@ -197,7 +462,8 @@ class ChromaStore:
 
     def add(self, content: str, metadata: dict | None = None) -> Item:
         """Store a new item."""
-        item_id = str(uuid4())
+        # Time-ordered ids keep inserts together in Chroma's SQLite indexes
+        item_id = str(uuid7())
         now = self._now()
 
         # Merge user metadata with timestamps
@@ -207,14 +473,17 @@ class ChromaStore:
             "updated_at": now
         }
 
+        # Check values now, so a bad one fails this add rather than the
+        # batch write it would be part of
+        validate_metadata(full_metadata)
+
         # Embed properties into document for semantic search
-        stored_content = _embed_properties(content, metadata)
+        stored_content = self._stored_content(content, metadata, full_metadata)
 
-        self._collection.add(
-            ids=[item_id],
-            documents=[stored_content],
-            metadatas=[full_metadata]
-        )
+        with self._batch_lock:
+            self._pending.append((item_id, stored_content, full_metadata))
+            if not self._batch_depth or len(self._pending) >= _MAX_BATCH_SIZE:
+                self.flush()
 
         return Item(
             id=item_id,
@@ -226,6 +495,7 @@ class ChromaStore:
 
     def get(self, id: str) -> Item | None:
         """Retrieve an item by ID."""
+        self.flush()
         result = self._collection.get(ids=[id], include=["documents", "metadatas"])
 
         if not result["ids"]:
@@ -239,41 +509,60 @@ class ChromaStore:
 
     def update(self, id: str, content: str | None = None, metadata: dict | None = None) -> Item | None:
         """Update an item's content and/or metadata."""
-        existing = self.get(id)
-        if not existing:
+        self.flush()
+
+        # The existing document is cheap to read, and lets an update that
+        # doesn't change it skip re-embedding
+        result = self._collection.get(ids=[id], include=["documents", "metadatas"])
+        if not result["ids"]:
             return None
 
+        existing_metadata = result["metadatas"][0]
+        created_at = existing_metadata.get("created_at", "")
+
         # Build updated values
-        new_content = content if content is not None else existing.content
+        if content is not None:
+            new_content = content
+        else:
+            new_content = existing_metadata.get("_raw_content")
+            if new_content is None:
+                new_content = _strip_properties(result["documents"][0])
         new_metadata = {
-            **existing.metadata,
+            **existing_metadata,
             **(metadata or {}),
-            "created_at": existing.created_at,
+            "created_at": created_at,
             "updated_at": self._now()
         }
 
         # Embed properties for semantic search (use user-facing metadata)
         user_metadata = _filter_metadata(new_metadata)
-        stored_content = _embed_properties(new_content, user_metadata)
+        stored_content = self._stored_content(new_content, user_metadata, new_metadata)
 
-        self._collection.update(
-            ids=[id],
-            documents=[stored_content],
-            metadatas=[new_metadata]
-        )
+        if stored_content == result["documents"][0]:
+            # Only unembedded metadata changed: write it without re-embedding
+            self._collection.update(ids=[id], metadatas=[new_metadata])
+        else:
+            self._collection.update(
+                ids=[id],
+                documents=[stored_content],
+                embeddings=self._embed_documents([stored_content]),
+                metadatas=[new_metadata]
+            )
 
         return Item(
             id=id,
             content=new_content,
             metadata=user_metadata,
-            created_at=existing.created_at,
+            created_at=created_at,
             updated_at=new_metadata["updated_at"]
         )
 
     def delete(self, id: str) -> bool:
         """Delete an item."""
-        existing = self.get(id)
-        if not existing:
+        self.flush()
+
+        # Existence check fetches ids only (Chroma's delete is silent on missing ids)
+        if not self._collection.get(ids=[id], include=[])["ids"]:
             return False
 
         self._collection.delete(ids=[id])
@@ -281,21 +570,29 @@ class ChromaStore:
 
     def upsert(self, id: str, content: str, metadata: dict | None = None) -> Item:
         """Create or update an item by ID."""
+        self.flush()
         now = self._now()
-        existing = self.get(id)
+
+        # Only the existing creation timestamp is needed
+        existing = self._collection.get(ids=[id], include=["metadatas"])
+        if existing["ids"]:
+            created_at = existing["metadatas"][0].get("created_at", now)
+        else:
+            created_at = now
 
         full_metadata = {
             **(metadata or {}),
-            "created_at": existing.created_at if existing else now,
+            "created_at": created_at,
             "updated_at": now,
         }
 
         # Embed properties for semantic search
-        stored_content = _embed_properties(content, metadata)
+        stored_content = self._stored_content(content, metadata, full_metadata)
 
         self._collection.upsert(
             ids=[id],
             documents=[stored_content],
+            embeddings=self._embed_documents([stored_content]),
             metadatas=[full_metadata]
         )
 
@@ -303,22 +600,26 @@ class ChromaStore:
             id=id,
             content=content,
             metadata=_filter_metadata(full_metadata),
-            created_at=full_metadata["created_at"],
+            created_at=created_at,
             updated_at=now,
         )
 
-    def query(
+    def _query_results(
         self,
-        text: str | None = None,
-        where: dict | None = None,
-        limit: int = 10
-    ) -> list[Item]:
-        """Query items by semantic similarity and/or metadata filters."""
+        text: str | None,
+        where: dict | None,
+        limit: int,
+        embedding: np.ndarray | None
+    ) -> tuple[list[str], list[str], list[dict]]:
+        """Run a query and return Chroma's (ids, documents, metadatas) lists."""
+        self.flush()
 
         if text:
             # Semantic search (with optional metadata filter)
+            if embedding is None:
+                embedding = self.embed(text)
             result = self._collection.query(
-                query_texts=[text],
+                query_embeddings=[embedding],
                 n_results=limit,
                 where=where,
                 include=["documents", "metadatas"]
@@ -338,7 +639,81 @@ class ChromaStore:
             documents = result["documents"]
             metadatas = result["metadatas"]
 
+        return ids, documents, metadatas
+
+    def query(
+        self,
+        text: str | None = None,
+        where: dict | None = None,
+        limit: int = 10,
+        embedding: np.ndarray | None = None
+    ) -> list[Item]:
+        """
+        Query items by semantic similarity and/or metadata filters.
+
+        Pass the embedding of text (from embed()) if already computed, to
+        avoid embedding it again.
+        """
+        ids, documents, metadatas = self._query_results(text, where, limit, embedding)
         return [
-            self._result_to_item(id=ids[i], document=documents[i], metadata=metadatas[i])
-            for i in range(len(ids))
+            self._result_to_item(item_id, document, metadata)
+            for item_id, document, metadata in zip(ids, documents, metadatas)
         ]
+
+    def query_columnar(
+        self,
+        text: str | None = None,
+        where: dict | None = None,
+        limit: int = 10,
+        embedding: np.ndarray | None = None
+    ) -> dict[str, list]:
+        """
+        Like query(), but return results as parallel lists instead of Items.
+
+        Skips building an Item per result, for callers that convert results
+        straight into another shape.
+        """
+        ids, documents, metadatas = self._query_results(text, where, limit, embedding)
+        item_content = self._item_content
+        return {
+            "ids": ids,
+            "contents": [item_content(d, m) for d, m in zip(documents, metadatas)],
+            "metadatas": [_filter_metadata(m) for m in metadatas],
+            "created_at": [m.get("created_at", "") for m in metadatas],
+            "updated_at": [m.get("updated_at", "") for m in metadatas],
+        }
+
+    def nearest(self, text: str, where: dict | None = None) -> tuple[Item, float] | None:
+        """
+        Find the single most similar item to a text.
+
+        Args:
+            text: Semantic search query
+            where: Optional metadata filter
+
+        Returns:
+            Tuple of (item, cosine distance), or None if nothing matches.
+        """
+        self.flush()
+        result = self._collection.query(
+            query_embeddings=[self.embed(text)],
+            n_results=1,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+        if not result["ids"][0]:
+            return None
+
+        item = self._result_to_item(
+            id=result["ids"][0][0],
+            document=result["documents"][0][0],
+            metadata=result["metadatas"][0][0]
+        )
+        return item, result["distances"][0][0]
+
+    def clear(self) -> None:
+        """Delete every item in the collection."""
+        self.flush()
+        ids = self._collection.get(include=[])["ids"]
+        if ids:
+            self._collection.delete(ids=ids)
@@ -6,39 +6,94 @@ These are the primitives the LLM can use. Higher-level concepts
 baking them into tools.
 """
 
-import functools
+import atexit
 import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Callable
 
-from .store import ChromaStore
+from .cache import SemanticQueryCache
+from .store import ChromaStore, Item
 
 logger = logging.getLogger(__name__)
 
 
 def log_tool_call(func: Callable) -> Callable:
     """Decorator to log tool calls with params and output."""
-    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        logger.debug(f"🧰 Tool call: {func.__name__}")
-        logger.debug(f"  Params: {kwargs}")
+        # Check the level first: formatting a large result is the real cost
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("🧰 Tool call: %s", func.__name__)
+            logger.debug("  Params: %s", kwargs)
         result = func(*args, **kwargs)
-        logger.debug(f"  Result: {result}")
+        if debug:
+            logger.debug("  Result: %s", result)
         return result
+
+    # Copy only what's used (names for logs and tracebacks, the docstring for
+    # help()) rather than everything functools.wraps copies
+    wrapper.__name__ = func.__name__
+    wrapper.__qualname__ = func.__qualname__
+    wrapper.__doc__ = func.__doc__
     return wrapper
 
 
-# Initialize stores
+# Initialize stores. Agent.achat batches each turn's item adds (see
+# ChromaStore): create_item's result is returned when the add is queued, and
+# the batch is written before any result goes back to the LLM, with failed
+# adds reported to it as errors. Outside a batch, adds are written at once.
 _items_store = ChromaStore(collection_name="items", persist_dir=".data")
 _gc_store = ChromaStore(collection_name="global_context", persist_dir=".data")
 
+# Semantic searches repeat often within and across turns; cleared on item writes
+_query_cache = SemanticQueryCache()
+
 # Global Context constants
 GC_ITEM_ID = "global_context"
+_GC_MULTI_NL_RE = re.compile(r"\n{2,}")
+
+# Serializes Global Context read-modify-write cycles (tools may run concurrently)
+_gc_lock = threading.Lock()
+
+# Global Context lines as last loaded or edited. Edits are written back
+# _GC_FLUSH_DELAY seconds after the first one, so a burst of edits is one upsert.
+_GC_FLUSH_DELAY = 0.2
+_gc_cache: list[str] | None = None
+_gc_dirty = False
+_gc_flush_timer: threading.Timer | None = None
+
+# Background writer for Global Context upserts that nothing waits on (e.g.
+# session-start compaction). A single worker keeps writes in order, and GC
+# reads are queued behind it so they always see those writes.
+_GC_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gc-writer")
+atexit.register(_GC_WRITER.shutdown)
+
+
+def flush_writes() -> None:
+    """Write any item adds still queued (reads flush on their own)."""
+    _items_store.flush()
+
+
+atexit.register(flush_writes)
 
 
 # ============================================================================
 # Item Operations
 # ============================================================================
 
+def _item_to_dict(item: Item) -> dict:
+    """Convert an Item to the dict shape tools return to the LLM."""
+    return {
+        "id": item.id,
+        "content": item.content,
+        "properties": item.metadata,
+        "created_at": item.created_at,
+        "updated_at": item.updated_at
+    }
+
+
 @log_tool_call
 def create_item(content: str, properties: dict[str, Any] | None = None) -> dict:
     """
@@ -52,13 +107,8 @@ def create_item(content: str, properties: dict[str, Any] | None = None) -> dict:
         The created item with id, content, properties, and timestamps.
     """
     item = _items_store.add(content, properties)
-    return {
-        "id": item.id,
-        "content": item.content,
-        "properties": item.metadata,
-        "created_at": item.created_at,
-        "updated_at": item.updated_at
-    }
+    _query_cache.clear()
+    return _item_to_dict(item)
 
 
 @log_tool_call
@@ -79,15 +129,10 @@ def update_item(
         The updated item, or None if not found.
     """
     item = _items_store.update(id, content, properties)
+    _query_cache.clear()
     if not item:
         return None
-    return {
-        "id": item.id,
-        "content": item.content,
-        "properties": item.metadata,
-        "created_at": item.created_at,
-        "updated_at": item.updated_at
-    }
+    return _item_to_dict(item)
 
 
 @log_tool_call
@@ -101,7 +146,9 @@ def delete_item(id: str) -> bool:
     Returns:
         True if deleted, False if not found.
     """
-    return _items_store.delete(id)
+    deleted = _items_store.delete(id)
+    _query_cache.clear()
+    return deleted
 
 
 @log_tool_call
@@ -121,17 +168,35 @@ def query_items(
     Returns:
         List of matching items.
     """
-    items = _items_store.query(text, where, limit)
-    return [
+    if text:
+        embedding = _items_store.embed(text)
+        cached = _query_cache.get(embedding, where, limit)
+        if cached is not None:
+            return cached
+        generation = _query_cache.generation
+        columns = _items_store.query_columnar(text, where, limit, embedding=embedding)
+    else:
+        columns = _items_store.query_columnar(text, where, limit)
+
+    results = [
         {
-            "id": item.id,
-            "content": item.content,
-            "properties": item.metadata,
-            "created_at": item.created_at,
-            "updated_at": item.updated_at
+            "id": item_id,
+            "content": content,
+            "properties": properties,
+            "created_at": created_at,
+            "updated_at": updated_at
         }
-        for item in items
+        for item_id, content, properties, created_at, updated_at in zip(
+            columns["ids"],
+            columns["contents"],
+            columns["metadatas"],
+            columns["created_at"],
+            columns["updated_at"]
+        )
     ]
+    if text:
+        _query_cache.put(embedding, where, limit, results, generation)
+    return results
 
 
 # ============================================================================
@@ -139,30 +204,66 @@ def query_items(
 # ============================================================================
 
 def _load_gc_lines() -> list[str]:
-    """Load Global Context and split into lines."""
-    item = _gc_store.get(GC_ITEM_ID)
-    if not item:
-        return []
-    return item.content.split("\n")
+    """Load Global Context lines, from memory after the first load (hold _gc_lock)."""
+    global _gc_cache
+    if _gc_cache is None:
+        item = _GC_WRITER.submit(_gc_store.get, GC_ITEM_ID).result()
+        _gc_cache = item.content.split("\n") if item else []
+    return _gc_cache
 
 
 def _save_gc_lines(lines: list[str]) -> None:
-    """Join lines and save Global Context."""
-    content = "\n".join(lines)
-    _gc_store.upsert(GC_ITEM_ID, content, {"item_type": "global_context"})
+    """Save Global Context lines, writing them back shortly (hold _gc_lock)."""
+    global _gc_cache, _gc_dirty, _gc_flush_timer
+    _gc_cache = lines
+    _gc_dirty = True
+    if _gc_flush_timer is None:
+        _gc_flush_timer = threading.Timer(_GC_FLUSH_DELAY, _flush_gc)
+        _gc_flush_timer.daemon = True
+        _gc_flush_timer.start()
+
+
+def _flush_gc() -> None:
+    """Queue pending Global Context edits on the GC writer."""
+    global _gc_dirty, _gc_flush_timer
+    with _gc_lock:
+        if _gc_flush_timer is not None:
+            _gc_flush_timer.cancel()
+            _gc_flush_timer = None
+        if not _gc_dirty:
+            return
+        content = "\n".join(_gc_cache)
+        _gc_dirty = False
+        try:
+            _GC_WRITER.submit(_gc_store.upsert, GC_ITEM_ID, content, {"item_type": "global_context"})
+        except RuntimeError:
+            # At exit the writer has already been shut down (after finishing
+            # its queue), so write directly
+            _gc_store.upsert(GC_ITEM_ID, content, {"item_type": "global_context"})
+
+
+atexit.register(_flush_gc)
+
+
+def _drop_gc_cache() -> None:
+    """Write pending edits and forget the cached lines (e.g. before compacting)."""
+    global _gc_cache
+    _flush_gc()
+    with _gc_lock:
+        _gc_cache = None
 
 
 def _format_gc_for_display(lines: list[str]) -> str:
     """Format with line numbers for system prompt injection."""
-    if not lines or all(line == "" for line in lines):
+    numbered = [f"{i}-- {line}" for i, line in enumerate(lines) if line]
+    if not numbered:
         return "(empty - populate as you learn about the user)"
-    return "\n".join(f"{i}-- {line}" for i, line in enumerate(lines) if line)
+    return "\n".join(numbered)
 
 
 def _compact_gc(text: str) -> str:
     """Remove empty lines between sessions."""
-    import re
-    return re.sub(r'\n{2,}', '\n', text).strip()
+    return _GC_MULTI_NL_RE.sub("\n", text).strip()
 
 
 @log_tool_call
@@ -179,9 +280,10 @@ def append_context(content: str) -> dict:
     Returns:
         Confirmation with the new line number.
     """
-    lines = _load_gc_lines()
-    lines.append(content)
-    _save_gc_lines(lines)
+    with _gc_lock:
+        lines = _load_gc_lines()
+        lines.append(content)
+        _save_gc_lines(lines)
     return {"line": len(lines) - 1, "content": content}
 
 
@@ -199,12 +301,13 @@ def replace_context(line: int, content: str) -> dict | None:
     Returns:
         Confirmation with old and new content, or None if line not found.
     """
-    lines = _load_gc_lines()
-    if line < 0 or line >= len(lines):
-        return None
-    old_content = lines[line]
-    lines[line] = content
-    _save_gc_lines(lines)
+    with _gc_lock:
+        lines = _load_gc_lines()
+        if line < 0 or line >= len(lines):
+            return None
+        old_content = lines[line]
+        lines[line] = content
+        _save_gc_lines(lines)
     return {"line": line, "old_content": old_content, "new_content": content}
 
 
@@ -222,12 +325,13 @@ def delete_context(line: int) -> dict | None:
     Returns:
         Confirmation with deleted content, or None if line not found.
     """
-    lines = _load_gc_lines()
-    if line < 0 or line >= len(lines):
-        return None
-    deleted_content = lines[line]
-    lines[line] = ""  # Replace with empty, compacted between sessions
-    _save_gc_lines(lines)
+    with _gc_lock:
+        lines = _load_gc_lines()
+        if line < 0 or line >= len(lines):
+            return None
+        deleted_content = lines[line]
+        lines[line] = ""  # Replace with empty, compacted between sessions
+        _save_gc_lines(lines)
     return {"line": line, "deleted_content": deleted_content}
 
 
@@ -245,6 +349,16 @@ TOOLS = {
     "delete_context": delete_context,
 }
 
+# Tools that change stored data (their effects invalidate cached responses)
+WRITE_TOOLS = frozenset({
+    "create_item",
+    "update_item",
+    "delete_item",
+    "append_context",
+    "replace_context",
+    "delete_context",
+})
+
 # Tool schemas for OpenAI-compatible function calling
 TOOL_SCHEMAS = [
     {
@@ -393,3 +507,83 @@ TOOL_SCHEMAS = [
         }
     }
 ]
+
+
+# ============================================================================
+# Dispatch
+# ============================================================================
+
+# Python types for the JSON Schema types used in TOOL_SCHEMAS
+_JSON_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "object": dict,
+    "array": list,
+}
+
+
+def _compile_validator(parameters: dict) -> Callable[[Any], str | None]:
+    """
+    Compile a tool's parameter schema into a validator function.
+
+    Supports the subset of JSON Schema that TOOL_SCHEMAS uses: top-level
+    property types, enums and required properties. Optional properties may
+    be null.
+    The validator returns an error message, or None if the arguments are valid.
+    """
+    properties = parameters.get("properties", {})
+    types = {name: _JSON_TYPES[spec["type"]] for name, spec in properties.items()}
+    type_names = {name: spec["type"] for name, spec in properties.items()}
+    enums = {name: tuple(spec["enum"]) for name, spec in properties.items() if "enum" in spec}
+    required = frozenset(parameters.get("required", ()))
+
+    def validate(arguments: Any) -> str | None:
+        if not isinstance(arguments, dict):
+            return "Arguments must be an object"
+        for name in required:
+            if name not in arguments:
+                return f"Missing required argument: {name}"
+        for name, value in arguments.items():
+            expected = types.get(name)
+            if expected is None:
+                return f"Unexpected argument: {name}"
+            if value is None and name not in required:
+                continue
+            # bool is an int subclass, but JSON true/false aren't integers
+            if not isinstance(value, expected) or (value.__class__ is bool and expected is not bool):
+                return f"Argument {name} must be of type {type_names[name]}"
+            if name in enums and value not in enums[name]:
+                return f"Argument {name} must be one of: {', '.join(map(str, enums[name]))}"
+        return None
+
+    return validate
+
+
+# Compiled once at import; checked on every tool call from the LLM
+TOOL_VALIDATORS = {
+    schema["function"]["name"]: _compile_validator(schema["function"]["parameters"])
+    for schema in TOOL_SCHEMAS
+}
+
+# Tool and validator together, so dispatch resolves a name in one lookup
+_DISPATCH = {name: (tool, TOOL_VALIDATORS[name]) for name, tool in TOOLS.items()}
+
+
+def dispatch(name: str, arguments: Any) -> Any:
+    """
+    Validate arguments against a tool's schema and call the tool.
+
+    Returns:
+        The tool's result, or an error dict for unknown tools and invalid
+        arguments (exceptions raised by the tool itself propagate).
+    """
+    entry = _DISPATCH.get(name)
+    if entry is None:
+        return {"error": f"Unknown tool: {name}"}
+    tool, validate = entry
+    error = validate(arguments)
+    if error is not None:
+        return {"error": error}
+    return tool(**arguments)
@@ -24,12 +24,16 @@ if __name__ == "__main__":
     )
 
     # Log startup context
-    logger.info(f"Model: {config.openrouter_model}")
+    logger.info("Model: %s", config.openrouter_model)
     logger.info(
-        f"Log levels: app={logging.getLevelName(config.log_level_app)}, deps={logging.getLevelName(config.log_level_deps)}"
+        "Log levels: app=%s, deps=%s",
+        logging.getLevelName(config.log_level_app),
+        logging.getLevelName(config.log_level_deps)
     )
     logger.info(
-        f"Log output: console={config.log_to_console}, file={config.log_file_path or 'disabled'}"
+        "Log output: console=%s, file=%s",
+        config.log_to_console,
+        config.log_file_path or "disabled"
     )
 
     main(config)
@@ -3,25 +3,39 @@
 Describe ChromaDB collections and their contents.
 
 Usage:
-    uv run python scripts/db_describe.py [--samples N]
+    uv run python scripts/db_describe.py [--samples N] [--fields-sample N]
 """
 
 import argparse
-import json
+import sys
 from pathlib import Path
+sys.path.insert(0, ".")
 
-import chromadb
-from chromadb.config import Settings
+# Fields whose distinct values are worth listing (excluding timestamps)
+CATEGORICAL_FIELDS = ("type", "status", "priority", "key", "value_type")
 
+# Names of the value types Chroma stores, so the scan needn't look up __name__
+_TYPE_NAME = {str: "str", int: "int", float: "float", bool: "bool", type(None): "NoneType"}
 
-def describe_db(persist_dir: str = ".data", show_samples: int = 0):
-    """Describe all collections in the ChromaDB."""
+
+def describe_db(persist_dir: str = ".data", show_samples: int = 0, fields_sample: int = 100):
+    """Describe all collections in the ChromaDB.
+
+    Metadata fields are discovered from the first fields_sample items of each
+    collection (0 skips field discovery, leaving just counts).
+    """
 
     db_path = Path(persist_dir)
     if not db_path.exists():
         print(f"Database not found at {persist_dir}")
         return
 
+    # Imported here so --help and bad arguments don't pay for loading Chroma
+    import chromadb
+    from chromadb.config import Settings
+
+    from agent_native_app.store import _INTERNAL_KEYS
+
     client = chromadb.PersistentClient(
         path=persist_dir,
         settings=Settings(anonymized_telemetry=False)
@@ -59,19 +73,28 @@ def describe_db(persist_dir: str = ".data", show_samples: int = 0):
         if count == 0:
             continue
 
-        # Get all items to analyze metadata keys
-        result = collection.get(
-            limit=min(count, 100),  # Sample up to 100 for analysis
-            include=["metadatas"]
-        )
+        # Sample items to analyze metadata keys (none read when disabled)
+        sampled_metadatas = []
+        if fields_sample > 0:
+            sampled_metadatas = collection.get(
+                limit=min(count, fields_sample),
+                include=["metadatas"]
+            )["metadatas"]
 
-        # Collect unique metadata keys and their types
+        # Collect unique metadata keys and their types, and the values of
+        # categorical fields, in one pass (skipping the store's internal keys)
         metadata_keys: dict[str, set] = {}
-        for meta in result["metadatas"]:
+        categorical_values: dict[str, set] = {}
+        for meta in sampled_metadatas:
             for key, value in meta.items():
+                if key in _INTERNAL_KEYS:
+                    continue
                 if key not in metadata_keys:
                     metadata_keys[key] = set()
-                metadata_keys[key].add(type(value).__name__)
+                value_type = type(value)
+                metadata_keys[key].add(_TYPE_NAME.get(value_type) or value_type.__name__)
+                if key in CATEGORICAL_FIELDS:
+                    categorical_values.setdefault(key, set()).add(str(value))
 
         if metadata_keys:
             print(f"  Metadata fields:")
@@ -79,16 +102,11 @@ def describe_db(persist_dir: str = ".data", show_samples: int = 0):
                 types_str = ", ".join(sorted(types))
                 print(f"    - {key}: {types_str}")
 
-        # Collect unique values for categorical fields (excluding timestamps)
-        categorical_fields = ["type", "status", "priority", "key", "value_type"]
-        for field in categorical_fields:
-            if field in metadata_keys:
-                values = set()
-                for meta in result["metadatas"]:
-                    if field in meta:
-                        values.add(str(meta[field]))
-                if values and len(values) <= 10:  # Only show if reasonable number
-                    print(f"  {field} values: {', '.join(sorted(values))}")
+        # Show unique values for categorical fields
+        for field in CATEGORICAL_FIELDS:
+            values = categorical_values.get(field)
+            if values and len(values) <= 10:  # Only show if reasonable number
+                print(f"  {field} values: {', '.join(sorted(values))}")
 
         # Show sample items
         if show_samples > 0:
@@ -103,14 +121,11 @@ def describe_db(persist_dir: str = ".data", show_samples: int = 0):
                 # Truncate long content
                 doc_preview = doc[:80] + "..." if len(doc) > 80 else doc
                 print(f"\n    [{item_id[:8]}] {doc_preview}")
-                # Show non-timestamp metadata, pretty printed
-                filtered_meta = {k: v for k, v in meta.items()
-                               if k not in ("created_at", "updated_at")}
-                if filtered_meta:
-                    pretty = json.dumps(filtered_meta, indent=2)
-                    # Indent each line for alignment
-                    indented = "\n".join("      " + line for line in pretty.split("\n"))
-                    print(indented)
+                # Show user metadata, one field per line (repr keeps "3" and 3
+                # apart); timestamps and the raw content copy are internal
+                for key, value in meta.items():
+                    if key not in _INTERNAL_KEYS:
+                        print(f"      {key}: {value!r}")
 
     # Footer with CLI docs link
     print("\n" + "=" * 60)
@@ -125,6 +140,12 @@ def main():
         default=0,
         help="Number of sample items to show per collection"
     )
+    parser.add_argument(
+        "--fields-sample", "-f",
+        type=int,
+        default=100,
+        help="Items read per collection to discover metadata fields (0 skips, default: 100)"
+    )
     parser.add_argument(
         "--db", "-d",
         type=str,
@@ -133,7 +154,7 @@ def main():
     )
 
     args = parser.parse_args()
-    describe_db(persist_dir=args.db, show_samples=args.samples)
+    describe_db(persist_dir=args.db, show_samples=args.samples, fields_sample=args.fields_sample)
 
 
 if __name__ == "__main__":
@@ -4,12 +4,38 @@ Migrate existing items to embed properties in document content.
 
 This re-saves all items so their properties are embedded for semantic search.
 Safe to run multiple times - idempotent.
+
+Usage:
+    uv run python scripts/migrate_embed_props.py [--db PATH]
 """
 
+import argparse
 import sys
+from typing import TYPE_CHECKING
 sys.path.insert(0, ".")
 
-from agent_native_app.store import ChromaStore, _embed_properties, _PROPS_DELIMITER
+# The store module loads chromadb, so it's imported only once there's work
+# to do (not for --help or bad arguments)
+if TYPE_CHECKING:
+    from agent_native_app.store import ChromaStore
+
+# Rows fetched, and re-saved in one update call, per page
+PAGE_SIZE = 500
+
+
+def _flush(store: "ChromaStore", ids: list[str], docs: list[str], metadatas: list[dict]) -> None:
+    """Write a batch of migrated items in one update call, then clear the batch."""
+    if not ids:
+        return
+    store._collection.update(
+        ids=ids,
+        documents=docs,
+        embeddings=store._embed_documents(docs),
+        metadatas=metadatas
+    )
+    ids.clear()
+    docs.clear()
+    metadatas.clear()
 
 
 def migrate_collection(collection_name: str, persist_dir: str = ".data") -> int:
@@ -18,57 +44,74 @@ def migrate_collection(collection_name: str, persist_dir: str = ".data") -> int:
 
     Returns count of migrated items.
     """
-    store = ChromaStore(collection_name=collection_name, persist_dir=persist_dir)
+    from agent_native_app.store import ChromaStore, _embed_properties, _PROPS_DELIMITER
 
-    # Get all items (no filter, high limit)
-    result = store._collection.get(
-        include=["documents", "metadatas"],
-        limit=10000
-    )
+    store = ChromaStore(collection_name=collection_name, persist_dir=persist_dir)
 
-    if not result["ids"]:
+    total = store._collection.count()
+    if not total:
         print(f"  No items in '{collection_name}'")
         return 0
 
     migrated = 0
-    skipped = 0
-
-    for i, item_id in enumerate(result["ids"]):
-        doc = result["documents"][i]
-        metadata = result["metadatas"][i]
-
-        # Check if already migrated
-        if _PROPS_DELIMITER in doc:
-            skipped += 1
-            continue
-
-        # Strip internal keys for embedding
-        user_metadata = {
-            k: v for k, v in metadata.items()
-            if k not in {"created_at", "updated_at"}
-        }
-
-        # Embed properties
-        new_doc = _embed_properties(doc, user_metadata)
-
-        # Update in place
-        store._collection.update(
-            ids=[item_id],
-            documents=[new_doc]
+    unchanged = 0
+    offset = 0
+    pending_ids: list[str] = []
+    pending_docs: list[str] = []
+    pending_metadatas: list[dict] = []
+
+    while True:
+        # One page at a time, of rows without embedded props only (Chroma
+        # filters out already-migrated rows). Migrated rows then drop out of
+        # the filter, so the offset only skips rows left as they were.
+        page = store._collection.get(
+            where_document={"$not_contains": _PROPS_DELIMITER},
+            include=["documents", "metadatas"],
+            limit=PAGE_SIZE,
+            offset=offset
         )
-        migrated += 1
-        print(f"  Migrated: {doc[:50]}...")
-
-    print(f"  {migrated} migrated, {skipped} already had embedded props")
+        if not page["ids"]:
+            break
+
+        for item_id, doc, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+            # Embed properties (internal keys are left out by _embed_properties)
+            new_doc = _embed_properties(doc, metadata)
+            if new_doc == doc:
+                # No properties to embed
+                unchanged += 1
+                offset += 1
+                continue
+
+            # Update in place (batched), keeping the original content for fast reads
+            pending_ids.append(item_id)
+            pending_docs.append(new_doc)
+            pending_metadatas.append({**metadata, "_raw_content": doc})
+            migrated += 1
+            print(f"  Migrated: {doc[:50]}...")
+
+        # Write before fetching the next page, whose contents depend on it
+        _flush(store, pending_ids, pending_docs, pending_metadatas)
+
+    skipped = total - migrated - unchanged
+    print(f"  {migrated} migrated, {skipped} already had embedded props, {unchanged} have no props")
     return migrated
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Embed properties into stored item documents")
+    parser.add_argument(
+        "--db", "-d",
+        type=str,
+        default=".data",
+        help="Path to ChromaDB directory (default: .data)"
+    )
+    args = parser.parse_args()
+
     print("Migrating items collection...")
-    items_count = migrate_collection("items")
+    items_count = migrate_collection("items", persist_dir=args.db)
 
     print("\nMigrating global_context collection...")
-    gc_count = migrate_collection("global_context")
+    gc_count = migrate_collection("global_context", persist_dir=args.db)
 
     print(f"\nDone! Total migrated: {items_count + gc_count}")
 
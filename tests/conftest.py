@@ -0,0 +1,19 @@
+"""Shared test setup."""
+
+import os
+import tempfile
+
+# tools.py opens its stores under ./.data when imported, which happens while
+# test modules are collected. Run the session from a scratch directory so
+# tests never read or write the developer's own database.
+_scratch = tempfile.TemporaryDirectory(prefix="agent-native-tests-")
+_invocation_dir = os.getcwd()
+
+
+def pytest_configure(config):
+    os.chdir(_scratch.name)
+
+
+def pytest_unconfigure(config):
+    os.chdir(_invocation_dir)
+    _scratch.cleanup()
@@ -0,0 +1,506 @@
+"""Tests for agent module: streamed turns against a fake LLM, and history bounds."""
+
+import asyncio
+import copy
+import logging
+import threading
+import time
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+from openai.types.chat.chat_completion_chunk import (
+    ChatCompletionChunk,
+    Choice,
+    ChoiceDelta,
+    ChoiceDeltaToolCall,
+    ChoiceDeltaToolCallFunction,
+)
+
+from agent_native_app import agent as agent_module
+from agent_native_app.agent import _HISTORY_START, _MAX_HISTORY_TOKENS, Agent, _report_unwritten
+from agent_native_app.config import Config
+from agent_native_app.store import WriteError
+from agent_native_app.tools import _items_store
+
+
+def _chunk(content: str | None = None, tool_calls: list | None = None) -> ChatCompletionChunk:
+    """One streamed chunk carrying a text and/or tool call delta."""
+    return ChatCompletionChunk(
+        id="chunk",
+        object="chat.completion.chunk",
+        created=0,
+        model="fake/model",
+        choices=[Choice(index=0, delta=ChoiceDelta(content=content, tool_calls=tool_calls))]
+    )
+
+
+def _call_delta(
+    index: int,
+    id: str | None = None,
+    name: str | None = None,
+    arguments: str | None = None
+) -> ChatCompletionChunk:
+    """One streamed chunk carrying part of a tool call."""
+    function = ChoiceDeltaToolCallFunction(name=name, arguments=arguments)
+    return _chunk(tool_calls=[ChoiceDeltaToolCall(index=index, id=id, function=function)])
+
+
+async def _stream(*chunks: ChatCompletionChunk):
+    for chunk in chunks:
+        yield chunk
+
+
+class FakeCompletions:
+    """
+    Stands in for client.chat.completions, replaying scripted streams.
+
+    Each request gets the next stream in self.streams, or respond(messages)
+    if set. A copy of every request's messages is kept in self.requests.
+    """
+
+    def __init__(self):
+        self.streams: list = []
+        self.respond = None
+        self.requests: list[list[dict]] = []
+
+    async def create(self, *, messages: list[dict], stream: bool, **kwargs):
+        assert stream
+        self.requests.append(copy.deepcopy(messages))
+        if self.respond is not None:
+            return self.respond(messages)
+        return self.streams.pop(0)
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    """Route the agent's LLM requests to a FakeCompletions."""
+    completions = FakeCompletions()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(agent_module, "_get_async_client", lambda *args: client)
+    return completions
+
+
+@pytest.fixture
+def tool_calls(monkeypatch):
+    """Record tool calls instead of running the tools."""
+    calls = []
+
+    def dispatch(name, arguments):
+        calls.append((name, arguments))
+        return {"ran": name}
+
+    monkeypatch.setattr(agent_module, "dispatch", dispatch)
+    return calls
+
+
+@pytest.fixture
+def agent(completions):
+    agent = Agent(Config("key", "fake/model", logging.INFO, logging.INFO, False, None))
+    yield agent
+    agent.close()
+
+
+def _tool_messages(messages: list[dict]) -> list[dict]:
+    return [m for m in messages if m["role"] == "tool"]
+
+
+def _text(message: dict) -> str:
+    """A message's text, whether or not it carries a cache breakpoint."""
+    content = message["content"]
+    return content if isinstance(content, str) else content[0]["text"]
+
+
+class TestStreamTurn:
+    """Tests for streaming responses and dispatching tool calls as they arrive."""
+
+    def test_text_streamed_through_on_text(self, agent, completions):
+        completions.streams.append(_stream(_chunk("You have "), _chunk("no tasks.")))
+        received = []
+
+        assert agent.chat("What's due?", on_text=received.append) == "You have no tasks."
+        assert received == ["You have ", "no tasks."]
+        assert agent._messages[-1] == {"role": "assistant", "content": "You have no tasks."}
+
+    def test_tool_call_split_across_chunks(self, agent, completions, tool_calls):
+        completions.streams += [
+            _stream(
+                _call_delta(0, id="call_0", name="query_items"),
+                _call_delta(0, arguments='{"text": '),
+                _call_delta(0, arguments='"milk"}'),
+            ),
+            _stream(_chunk("Found it.")),
+        ]
+
+        assert agent.chat("Where's the milk note?") == "Found it."
+        assert tool_calls == [("query_items", {"text": "milk"})]
+        # The result goes back to the LLM, paired with its call
+        assert completions.requests[1][-2]["tool_calls"][0]["id"] == "call_0"
+        assert completions.requests[1][-1]["tool_call_id"] == "call_0"
+
+    def test_tool_dispatched_before_stream_ends(self, agent, completions, monkeypatch):
+        started = threading.Event()
+        started_early = []
+
+        def dispatch(name, arguments):
+            started.set()
+            return {"ran": name}
+
+        async def stream():
+            yield _call_delta(0, id="call_0", name="query_items", arguments='{"text": "milk"}')
+            # The stream is still open: the call must run without waiting for it
+            started_early.append(await asyncio.to_thread(started.wait, 5))
+            yield _chunk("Looking.")
+
+        monkeypatch.setattr(agent_module, "dispatch", dispatch)
+        completions.streams += [stream(), _stream(_chunk("Found it."))]
+
+        agent.chat("Where's the milk note?")
+        assert started_early == [True]
+
+    def test_invalid_json_arguments_dispatched_as_empty(self, agent, completions, tool_calls):
+        completions.streams += [
+            _stream(_call_delta(0, id="call_0", name="query_items", arguments='{"text": }')),
+            _stream(_chunk("Sorry.")),
+        ]
+
+        agent.chat("Where's the milk note?")
+        assert tool_calls == [("query_items", {})]
+
+
+def _turn(n: int) -> list[dict]:
+    """One user turn in which the assistant calls a tool and then answers."""
+    call_id = f"call_{n}"
+    return [
+        {"role": "user", "content": f"Question {n}"},
+        {
+            "role": "assistant",
+            "content": f"Looking up {n}",
+            "tool_calls": [{
+                "id": call_id,
+                "type": "function",
+                "function": {"name": "search_items", "arguments": "{}"}
+            }]
+        },
+        {"role": "tool", "tool_call_id": call_id, "content": "[]"},
+        {"role": "assistant", "content": f"Answer {n}"},
+    ]
+
+
+class TestInterruptedStream:
+    """Tests for a stream that fails after some tool calls already ran."""
+
+    @staticmethod
+    async def _failing_stream():
+        yield _chunk("Saving.")
+        yield _call_delta(0, id="call_0", name="create_item", arguments='{"content": "Buy milk"}')
+        yield _call_delta(1, id="call_1", name="create_item", arguments='{"content": "Bu')
+        raise ConnectionError("stream dropped")
+
+    def test_stream_error_raised(self, agent, completions, tool_calls):
+        completions.streams.append(self._failing_stream())
+
+        with pytest.raises(ConnectionError, match="stream dropped"):
+            agent.chat("Remind me to buy milk and bread")
+
+    def test_calls_that_ran_recorded(self, agent, completions, tool_calls):
+        completions.streams.append(self._failing_stream())
+
+        with pytest.raises(ConnectionError):
+            agent.chat("Remind me to buy milk and bread")
+        # Only the complete call ran, and it stays paired with its result
+        assert tool_calls == [("create_item", {"content": "Buy milk"})]
+        assistant, result = agent._messages[-2:]
+        assert assistant["content"] == "Saving."
+        assert [call["id"] for call in assistant["tool_calls"]] == ["call_0"]
+        assert result["tool_call_id"] == "call_0"
+        assert _text(result) == '{"ran":"create_item"}'
+
+    def test_next_turn_sees_calls_that_ran(self, agent, completions, tool_calls):
+        completions.streams += [self._failing_stream(), _stream(_chunk("Milk is saved."))]
+
+        with pytest.raises(ConnectionError):
+            agent.chat("Remind me to buy milk and bread")
+        agent.chat("Did that work?")
+        request = completions.requests[1]
+        assert request[-2]["tool_call_id"] == "call_0"
+        assert _text(request[-1]) == "Did that work?"
+
+    def test_failure_before_any_call_records_nothing(self, agent, completions, tool_calls):
+        async def stream():
+            yield _chunk("Saving.")
+            raise ConnectionError("stream dropped")
+
+        completions.streams.append(stream())
+
+        with pytest.raises(ConnectionError):
+            agent.chat("Remind me to buy milk")
+        assert tool_calls == []
+        assert agent._messages[-1]["role"] == "user"
+
+
+class TestParallelToolCalls:
+    """Tests for running the tool calls of one response concurrently."""
+
+    def test_calls_run_concurrently(self, agent, completions, monkeypatch):
+        # Each call waits for the other, so they only finish if run together
+        barrier = threading.Barrier(2, timeout=5)
+
+        def dispatch(name, arguments):
+            barrier.wait()
+            return {"ran": arguments["text"]}
+
+        monkeypatch.setattr(agent_module, "dispatch", dispatch)
+        completions.streams += [
+            _stream(
+                _call_delta(0, id="call_0", name="query_items", arguments='{"text": "milk"}'),
+                _call_delta(1, id="call_1", name="query_items", arguments='{"text": "eggs"}'),
+            ),
+            _stream(_chunk("Found both.")),
+        ]
+
+        agent.chat("Find milk and eggs")
+        assert [_text(m) for m in _tool_messages(completions.requests[1])] == [
+            '{"ran":"milk"}', '{"ran":"eggs"}'
+        ]
+
+    def test_results_in_call_order(self, agent, completions, monkeypatch):
+        def dispatch(name, arguments):
+            # The first call finishes last
+            if arguments["text"] == "milk":
+                time.sleep(0.05)
+            return {"ran": arguments["text"]}
+
+        monkeypatch.setattr(agent_module, "dispatch", dispatch)
+        completions.streams += [
+            _stream(
+                _call_delta(0, id="call_0", name="query_items", arguments='{"text": "milk"}'),
+                _call_delta(1, id="call_1", name="query_items", arguments='{"text": "eggs"}'),
+            ),
+            _stream(_chunk("Found both.")),
+        ]
+
+        agent.chat("Find milk and eggs")
+        tool_messages = _tool_messages(completions.requests[1])
+        assert [m["tool_call_id"] for m in tool_messages] == ["call_0", "call_1"]
+        assert _text(tool_messages[0]) == '{"ran":"milk"}'
+
+
+class TestBatchedWrites:
+    """Tests for reporting item adds that fail when a turn's batch is written."""
+
+    def test_report_unwritten_replaces_failed_creates(self):
+        results = [{"id": "a", "content": "good"}, {"id": "b", "content": "bad"}, {"error": "Unknown tool: x"}]
+
+        assert _report_unwritten(results, {"b": ValueError("disk full")}) == [
+            {"id": "a", "content": "good"},
+            {"error": "Item was not saved: disk full"},
+            {"error": "Unknown tool: x"},
+        ]
+
+    def test_failed_add_reported_to_llm(self, agent, completions, monkeypatch):
+        add = _items_store._collection.add
+
+        def failing_add(**kwargs):
+            if any(document.startswith("Unsaveable") for document in kwargs["documents"]):
+                raise ValueError("disk full")
+            add(**kwargs)
+
+        monkeypatch.setattr(_items_store._collection, "add", failing_add)
+        completions.streams += [
+            _stream(
+                _call_delta(0, id="call_0", name="create_item", arguments='{"content": "Saveable note"}'),
+                _call_delta(1, id="call_1", name="create_item", arguments='{"content": "Unsaveable note"}'),
+            ),
+            _stream(_chunk("Saved one.")),
+        ]
+
+        agent.chat("Save two notes")
+        saved, unsaved = _tool_messages(completions.requests[1])
+        assert '"content":"Saveable note"' in _text(saved)
+        assert _text(unsaved) == '{"error":"Item was not saved: disk full"}'
+        assert _items_store.get(orjson.loads(_text(saved))["id"]).content == "Saveable note"
+
+
+class TestCacheBreakpoints:
+    """Tests for the rolling prompt cache breakpoint on the conversation."""
+
+    @staticmethod
+    def _marked(messages: list[dict]) -> list[int]:
+        """Indexes of messages carrying a cache breakpoint."""
+        return [
+            i for i, m in enumerate(messages)
+            if isinstance(m["content"], list) and "cache_control" in m["content"][0]
+        ]
+
+    def test_breakpoint_on_latest_user_message(self, agent, completions):
+        completions.streams.append(_stream(_chunk("Hi.")))
+
+        agent.chat("Hello")
+        # The static system prompt, and the new user message
+        assert self._marked(completions.requests[0]) == [0, _HISTORY_START]
+
+    def test_breakpoint_moves_to_last_tool_result(self, agent, completions, tool_calls):
+        completions.streams += [
+            _stream(
+                _call_delta(0, id="call_0", name="query_items", arguments='{"text": "milk"}'),
+                _call_delta(1, id="call_1", name="query_items", arguments='{"text": "eggs"}'),
+            ),
+            _stream(_chunk("Found both.")),
+        ]
+
+        agent.chat("Find milk and eggs")
+        request = completions.requests[1]
+        assert self._marked(request) == [0, len(request) - 1]
+        assert request[-1]["tool_call_id"] == "call_1"
+        assert request[_HISTORY_START] == {"role": "user", "content": "Find milk and eggs"}
+
+    def test_breakpoint_moves_to_next_user_message(self, agent, completions):
+        completions.streams += [_stream(_chunk("Hi.")), _stream(_chunk("Bye."))]
+
+        agent.chat("Hello")
+        agent.chat("Goodbye")
+        request = completions.requests[1]
+        assert self._marked(request) == [0, len(request) - 1]
+        assert _text(request[-1]) == "Goodbye"
+        assert request[_HISTORY_START] == {"role": "user", "content": "Hello"}
+
+    def test_reset_forgets_breakpoint(self, agent, completions):
+        completions.streams += [_stream(_chunk("Hi.")), _stream(_chunk("Hi again."))]
+
+        agent.chat("Hello")
+        agent.reset()
+        agent.chat("Hello again")
+        assert self._marked(completions.requests[1]) == [0, _HISTORY_START]
+
+
+class TestChatBatch:
+    """Tests for answering independent prompts concurrently."""
+
+    @pytest.fixture
+    def completions(self, completions):
+        """Answer each prompt after a delay, so later prompts finish first."""
+        delays = {"first": 0.3, "second": 0.2, "third": 0.1}
+
+        async def respond(messages):
+            prompt = messages[-1]["content"]
+            prompt = prompt if isinstance(prompt, str) else prompt[0]["text"]
+            await asyncio.sleep(delays[prompt])
+            yield _chunk(f"Answer to {prompt}")
+
+        completions.respond = respond
+        return completions
+
+    def test_results_in_prompt_order(self, agent):
+        assert agent.chat_batch(["first", "second", "third"]) == [
+            "Answer to first", "Answer to second", "Answer to third"
+        ]
+
+    def test_prompts_run_concurrently(self, agent):
+        start = time.monotonic()
+        agent.chat_batch(["first", "second", "third"])
+
+        # Run one after another they would take 0.6s
+        assert time.monotonic() - start < 0.5
+
+    def test_forks_leave_parent_history_alone(self, agent, completions):
+        agent.chat("first")
+        history = copy.deepcopy(agent._messages)
+
+        agent.chat_batch(["second", "third"])
+        assert agent._messages == history
+
+    def test_forks_see_only_their_own_prompt(self, agent, completions):
+        agent.chat("first")
+
+        agent.chat_batch(["second", "third"])
+        for request in completions.requests[1:]:
+            conversation = request[_HISTORY_START:]
+            assert len(conversation) == 1
+            assert _text(conversation[0]) in ("second", "third")
+            assert request[:_HISTORY_START] == completions.requests[0][:_HISTORY_START]
+
+
+class TestClose:
+    """Tests for releasing an agent's HTTP clients and event loop."""
+
+    def test_closes_clients_when_write_fails(self, monkeypatch):
+        def failing_flush():
+            raise WriteError({"item": ValueError("disk full")})
+
+        monkeypatch.setattr(agent_module, "flush_writes", failing_flush)
+        agent = Agent(Config("key", "fake/model", logging.INFO, logging.INFO, False, None))
+        client = agent._runner.run(self._open_client(agent))
+
+        with pytest.raises(WriteError):
+            agent.close()
+        assert client.is_closed()
+        assert client not in agent_module._async_clients.values()
+        with pytest.raises(RuntimeError, match="closed"):
+            agent._runner.get_loop()
+
+    @staticmethod
+    async def _open_client(agent: Agent):
+        return agent_module._get_async_client(agent._api_key, agent._base_url, asyncio.get_running_loop())
+
+
+class TestCompactHistory:
+    """Tests for Agent._compact_history."""
+
+    @pytest.fixture
+    def agent(self):
+        """An agent with only the state _compact_history uses (no LLM client or stores)."""
+        agent = Agent.__new__(Agent)
+        agent._messages = [
+            {"role": "system", "content": "static prompt"},
+            {"role": "system", "content": "session context"},
+        ]
+        agent._max_history_tokens = _MAX_HISTORY_TOKENS
+        return agent
+
+    def _history(self, agent: Agent) -> list[dict]:
+        return agent._messages[_HISTORY_START:]
+
+    def test_recent_turns_kept_intact(self, agent):
+        agent._messages += _turn(1) + _turn(2)
+
+        agent._compact_history()
+        assert self._history(agent) == _turn(1) + _turn(2)
+
+    def test_old_tool_exchanges_dropped(self, agent):
+        agent._messages += _turn(1) + _turn(2) + _turn(3)
+
+        agent._compact_history()
+        assert self._history(agent) == [
+            {"role": "user", "content": "Question 1"},
+            {"role": "assistant", "content": "Looking up 1"},
+            {"role": "assistant", "content": "Answer 1"},
+        ] + _turn(2) + _turn(3)
+
+    def test_tool_calls_stay_paired_with_results(self, agent):
+        agent._messages += _turn(1) + _turn(2) + _turn(3) + _turn(4)
+
+        agent._compact_history()
+        history = self._history(agent)
+        call_ids = [call["id"] for m in history for call in m.get("tool_calls", ())]
+        result_ids = [m["tool_call_id"] for m in history if m["role"] == "tool"]
+        assert call_ids == result_ids == ["call_3", "call_4"]
+
+    def test_oldest_turns_dropped_over_budget(self, agent):
+        agent._messages += _turn(1) + _turn(2) + _turn(3)
+        agent._max_history_tokens = 1
+
+        agent._compact_history()
+        # The current turn is always kept, with its tool exchange
+        assert self._history(agent) == _turn(3)
+
+    def test_system_prompts_never_dropped(self, agent):
+        agent._messages += _turn(1) + _turn(2) + _turn(3)
+        agent._max_history_tokens = 1
+
+        agent._compact_history()
+        assert agent._messages[:_HISTORY_START] == [
+            {"role": "system", "content": "static prompt"},
+            {"role": "system", "content": "session context"},
+        ]
@@ -0,0 +1,131 @@
+"""Tests for cache module: scoping and invalidation of cached responses and searches."""
+
+import numpy as np
+import pytest
+
+from agent_native_app.cache import SemanticQueryCache, SemanticResponseCache, response_scope
+from agent_native_app.store import ChromaStore
+
+
+class TestResponseScope:
+    """Tests for response_scope helper."""
+
+    def test_same_inputs_same_scope(self):
+        assert response_scope("model", "system", "context") == response_scope("model", "system", "context")
+
+    def test_model_changes_scope(self):
+        assert response_scope("model-a", "system") != response_scope("model-b", "system")
+
+    def test_prompts_change_scope(self):
+        assert response_scope("model", "system", "Today is Monday") != response_scope(
+            "model", "system", "Today is Tuesday"
+        )
+
+    def test_prompt_boundaries_matter(self):
+        # Prompts are joined with a separator, so moving text between them
+        # doesn't produce the same scope
+        assert response_scope("model", "ab", "c") != response_scope("model", "a", "bc")
+
+
+class TestSemanticResponseCache:
+    """Tests for SemanticResponseCache backed by a ChromaStore."""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        """Create a response cache on a temporary store."""
+        store = ChromaStore(collection_name="test_llm_cache", persist_dir=str(tmp_path), embed_properties=False)
+        return SemanticResponseCache(store)
+
+    def test_same_prompt_hits(self, cache):
+        cache.put("What tasks do I have?", "scope-a", "You have three tasks.")
+
+        assert cache.get("What tasks do I have?", "scope-a") == "You have three tasks."
+        assert cache.hits == 1
+
+    def test_empty_cache_misses(self, cache):
+        assert cache.get("What tasks do I have?", "scope-a") is None
+        assert cache.misses == 1
+
+    def test_unrelated_prompt_misses(self, cache):
+        cache.put("What tasks do I have?", "scope-a", "You have three tasks.")
+
+        assert cache.get("Remind me to water the plants", "scope-a") is None
+
+    def test_other_scope_misses(self, cache):
+        cache.put("What tasks do I have?", "scope-a", "You have three tasks.")
+
+        assert cache.get("What tasks do I have?", "scope-b") is None
+
+    def test_scopes_kept_apart(self, cache):
+        cache.put("What tasks do I have?", "scope-a", "Answer A")
+        cache.put("What tasks do I have?", "scope-b", "Answer B")
+
+        assert cache.get("What tasks do I have?", "scope-a") == "Answer A"
+        assert cache.get("What tasks do I have?", "scope-b") == "Answer B"
+
+    def test_clear_drops_all_responses(self, cache):
+        cache.put("What tasks do I have?", "scope-a", "Answer A")
+        cache.put("What tasks do I have?", "scope-b", "Answer B")
+
+        cache.clear()
+        assert cache.get("What tasks do I have?", "scope-a") is None
+        assert cache.get("What tasks do I have?", "scope-b") is None
+
+
+class TestSemanticQueryCache:
+    """Tests for SemanticQueryCache, the in-memory search result cache."""
+
+    @pytest.fixture
+    def cache(self):
+        return SemanticQueryCache(min_similarity=0.95, max_entries=2)
+
+    def test_similar_embedding_hits(self, cache):
+        cache.put(np.array([1.0, 0.0]), None, 10, "results", cache.generation)
+
+        assert cache.get(np.array([1.0, 0.01]), None, 10) == "results"
+
+    def test_dissimilar_embedding_misses(self, cache):
+        cache.put(np.array([1.0, 0.0]), None, 10, "results", cache.generation)
+
+        assert cache.get(np.array([0.0, 1.0]), None, 10) is None
+
+    def test_filter_and_limit_must_match(self, cache):
+        cache.put(np.array([1.0, 0.0]), {"type": "task"}, 10, "results", cache.generation)
+
+        assert cache.get(np.array([1.0, 0.0]), {"type": "note"}, 10) is None
+        assert cache.get(np.array([1.0, 0.0]), {"type": "task"}, 5) is None
+        assert cache.get(np.array([1.0, 0.0]), {"type": "task"}, 10) == "results"
+
+    def test_oldest_entry_evicted(self, cache):
+        cache.put(np.array([1.0, 0.0]), None, 10, "first", cache.generation)
+        cache.put(np.array([0.0, 1.0]), None, 10, "second", cache.generation)
+        cache.put(np.array([-1.0, 0.0]), None, 10, "third", cache.generation)
+
+        assert cache.get(np.array([1.0, 0.0]), None, 10) is None
+        assert cache.get(np.array([0.0, 1.0]), None, 10) == "second"
+        assert cache.get(np.array([-1.0, 0.0]), None, 10) == "third"
+
+    def test_hit_refreshes_entry(self, cache):
+        cache.put(np.array([1.0, 0.0]), None, 10, "first", cache.generation)
+        cache.put(np.array([0.0, 1.0]), None, 10, "second", cache.generation)
+
+        # Using the first entry makes the second the least recently used
+        assert cache.get(np.array([1.0, 0.0]), None, 10) == "first"
+        cache.put(np.array([-1.0, 0.0]), None, 10, "third", cache.generation)
+
+        assert cache.get(np.array([1.0, 0.0]), None, 10) == "first"
+        assert cache.get(np.array([0.0, 1.0]), None, 10) is None
+
+    def test_clear_drops_entries(self, cache):
+        cache.put(np.array([1.0, 0.0]), None, 10, "results", cache.generation)
+
+        cache.clear()
+        assert cache.get(np.array([1.0, 0.0]), None, 10) is None
+
+    def test_results_from_before_clear_not_cached(self, cache):
+        # A search started, then a write cleared the cache before it finished
+        generation = cache.generation
+        cache.clear()
+        cache.put(np.array([1.0, 0.0]), None, 10, "stale", generation)
+
+        assert cache.get(np.array([1.0, 0.0]), None, 10) is None
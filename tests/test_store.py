@@ -1,19 +1,31 @@
 """Tests for store module, focusing on property embedding for semantic search."""
 
-import tempfile
+import time
+import uuid
 
 import pytest
 
+from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+
 from agent_native_app.store import (
+    _EMBEDDING_FUNCTION,
     ChromaStore,
     _embed_properties,
     _format_date_value,
     _is_date_key,
     _PROPS_DELIMITER,
     _strip_properties,
+    uuid7,
+    WriteError,
 )
 
 
+@pytest.fixture(scope="class")
+def data_dir(tmp_path_factory):
+    """One temporary database per test class, so Chroma opens it once."""
+    return str(tmp_path_factory.mktemp("chroma"))
+
+
 class TestIsDateKey:
     """Tests for _is_date_key helper."""
 
@@ -88,6 +100,18 @@ class TestFormatDateValue:
     def test_empty_string(self):
         assert _format_date_value("") == ""
 
+    def test_non_string_returned_unchanged(self):
+        assert _format_date_value(3) == 3
+        assert _format_date_value(None) is None
+
+    def test_repeated_value_is_memoized(self):
+        _format_date_value.cache_clear()
+        first = _format_date_value("2026-01-13")
+        assert _format_date_value("2026-01-13") == first
+        info = _format_date_value.cache_info()
+        assert info.misses == 1
+        assert info.hits == 1
+
 
 class TestEmbedProperties:
     """Tests for _embed_properties helper."""
@@ -135,6 +159,10 @@ class TestEmbedProperties:
         assert "created_at" not in result
         assert "updated_at" not in result
 
+    def test_already_embedded_content_unchanged(self):
+        stored = _embed_properties("Task", {"type": "task"})
+        assert _embed_properties(stored, {"type": "task", "status": "active"}) == stored
+
     def test_preserves_original_content(self):
         content = "Multi\nline\ncontent"
         metadata = {"type": "note"}
@@ -167,16 +195,49 @@ class TestStripProperties:
         assert result == "Line 1\nLine 2\nLine 3"
 
 
+class TestUuid7:
+    """Tests for uuid7, the id generator for new items."""
+
+    def test_version_and_variant(self):
+        value = uuid7()
+        assert value.version == 7
+        assert value.variant == uuid.RFC_4122
+
+    def test_starts_with_unix_milliseconds(self):
+        before = time.time_ns() // 1_000_000
+        value = uuid7()
+        after = time.time_ns() // 1_000_000
+
+        assert before <= value.int >> 80 <= after
+
+    def test_ids_are_unique(self):
+        assert len({uuid7() for _ in range(1000)}) == 1000
+
+    def test_later_ids_sort_after_earlier_ones(self):
+        first = uuid7()
+        time.sleep(0.002)
+        second = uuid7()
+
+        assert str(first) < str(second)
+
+
 class TestChromaStoreIntegration:
     """Integration tests for ChromaStore with property embedding."""
 
     @pytest.fixture
-    def store(self):
-        """Create a temporary ChromaStore for testing."""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            yield ChromaStore(collection_name="test_items", persist_dir=tmpdir)
+    def store(self, data_dir):
+        """Create a ChromaStore on a fresh collection, so tests don't share items."""
+        return ChromaStore(collection_name=f"test_items_{uuid.uuid4().hex}", persist_dir=data_dir)
 
-    def test_add_embeds_properties(self, store):
+    @pytest.fixture
+    def raw_docs(self, store):
+        """Fetch stored documents (with embedded props) for many ids in one call."""
+        def fetch(ids: list[str]) -> dict[str, str]:
+            raw = store._collection.get(ids=ids, include=["documents"])
+            return dict(zip(raw["ids"], raw["documents"]))
+        return fetch
+
+    def test_add_embeds_properties(self, store, raw_docs):
         item = store.add(
             content="Review report",
             metadata={"type": "task", "due_date": "2026-01-13"}
@@ -187,8 +248,7 @@ class TestChromaStoreIntegration:
         assert _PROPS_DELIMITER not in item.content
 
         # Stored content should have embedded props
-        raw = store._collection.get(ids=[item.id], include=["documents"])
-        stored_doc = raw["documents"][0]
+        stored_doc = raw_docs([item.id])[item.id]
         assert _PROPS_DELIMITER in stored_doc
         assert "January 13 2026" in stored_doc
 
@@ -221,7 +281,7 @@ class TestChromaStoreIntegration:
         assert len(results) > 0
         assert "Meeting with client" in results[0].content
 
-    def test_update_reembeds_properties(self, store):
+    def test_update_reembeds_properties(self, store, raw_docs):
         item = store.add(
             content="Original task",
             metadata={"status": "active"}
@@ -232,12 +292,11 @@ class TestChromaStoreIntegration:
         assert updated.content == "Original task"
 
         # Check stored doc has both properties
-        raw = store._collection.get(ids=[item.id], include=["documents"])
-        stored_doc = raw["documents"][0]
+        stored_doc = raw_docs([item.id])[item.id]
         assert "status: active" in stored_doc
         assert "priority: high" in stored_doc
 
-    def test_update_content_reembeds(self, store):
+    def test_update_content_reembeds(self, store, raw_docs):
         item = store.add(
             content="Original",
             metadata={"type": "task"}
@@ -246,12 +305,11 @@ class TestChromaStoreIntegration:
         updated = store.update(item.id, content="Updated content")
         assert updated.content == "Updated content"
 
-        raw = store._collection.get(ids=[item.id], include=["documents"])
-        stored_doc = raw["documents"][0]
+        stored_doc = raw_docs([item.id])[item.id]
         assert stored_doc.startswith("Updated content")
         assert "type: task" in stored_doc
 
-    def test_upsert_embeds_properties(self, store):
+    def test_upsert_embeds_properties(self, store, raw_docs):
         item = store.upsert(
             id="custom-id",
             content="Upserted item",
@@ -260,8 +318,7 @@ class TestChromaStoreIntegration:
 
         assert item.content == "Upserted item"
 
-        raw = store._collection.get(ids=["custom-id"], include=["documents"])
-        stored_doc = raw["documents"][0]
+        stored_doc = raw_docs(["custom-id"])["custom-id"]
         assert "category: test" in stored_doc
 
     def test_metadata_still_works_for_filtering(self, store):
@@ -284,3 +341,188 @@ class TestChromaStoreIntegration:
         # Should retrieve cleanly
         item = store.get("legacy-id")
         assert item.content == "Legacy content without props"
+
+    def test_raw_content_kept_out_of_metadata(self, store):
+        item = store.add(content="Buy milk", metadata={"type": "task"})
+
+        raw = store._collection.get(ids=[item.id], include=["metadatas"])
+        assert raw["metadatas"][0]["_raw_content"] == "Buy milk"
+
+        retrieved = store.get(item.id)
+        assert retrieved.content == "Buy milk"
+        assert "_raw_content" not in retrieved.metadata
+
+    def test_query_with_precomputed_embedding(self, store):
+        store.add(content="Buy groceries", metadata={"type": "task"})
+        store.add(content="Call the dentist", metadata={"type": "task"})
+
+        embedding = store.embed("Buy groceries")
+        results = store.query("Buy groceries", limit=1, embedding=embedding)
+        assert results[0].content == "Buy groceries"
+
+    def test_query_columnar_matches_query(self, store):
+        store.add(content="Buy milk", metadata={"type": "task", "due_date": "2026-01-13"})
+        store.add(content="Idea", metadata={"type": "idea"})
+
+        items = store.query(where={"type": "task"})
+        columns = store.query_columnar(where={"type": "task"})
+
+        assert columns["ids"] == [item.id for item in items]
+        assert columns["contents"] == ["Buy milk"]
+        assert columns["metadatas"] == [{"type": "task", "due_date": "2026-01-13"}]
+        assert columns["created_at"] == [items[0].created_at]
+
+    def test_update_without_document_change_skips_reembedding(self, store, monkeypatch):
+        item = store.add(content="Buy milk", metadata={"status": "active"})
+
+        calls = []
+        original_update = store._collection.update
+        monkeypatch.setattr(
+            store._collection, "update",
+            lambda **kwargs: calls.append(kwargs) or original_update(**kwargs)
+        )
+
+        # Same property value: the embedded document doesn't change
+        store.update(item.id, metadata={"status": "active"})
+        assert "documents" not in calls[-1]
+
+        store.update(item.id, metadata={"status": "done"})
+        assert "documents" in calls[-1]
+        assert store.get(item.id).metadata == {"status": "done"}
+
+    def test_nearest_returns_closest_with_distance(self, store):
+        store.add(content="Buy groceries", metadata={"type": "task"})
+        store.add(content="Call the dentist", metadata={"type": "task"})
+
+        item, distance = store.nearest("Buy groceries")
+        assert item.content == "Buy groceries"
+        assert distance < 0.5
+
+    def test_nearest_empty_collection(self, store):
+        assert store.nearest("anything") is None
+
+    def test_clear_removes_all_items(self, store):
+        store.add(content="First")
+        store.add(content="Second")
+
+        store.clear()
+        assert store.query(limit=10) == []
+
+    def test_embed_properties_disabled(self, data_dir):
+        store = ChromaStore(collection_name="test_raw", persist_dir=data_dir, embed_properties=False)
+        item = store.add(content="Prompt text", metadata={"response": "Answer"})
+
+        raw = store._collection.get(ids=[item.id], include=["documents"])
+        assert raw["documents"][0] == "Prompt text"
+
+    def test_stores_share_one_embedding_model(self, data_dir, monkeypatch):
+        # Count model loads from a fresh start, wherever Chroma or the store
+        # might construct one
+        constructed = []
+        original_init = ONNXMiniLM_L6_V2.__init__
+
+        def counting_init(self, *args, **kwargs):
+            constructed.append(self)
+            original_init(self, *args, **kwargs)
+
+        monkeypatch.setattr(ONNXMiniLM_L6_V2, "__init__", counting_init)
+        monkeypatch.setattr(_EMBEDDING_FUNCTION, "_model", None)
+
+        first = ChromaStore(collection_name="test_one", persist_dir=data_dir)
+        second = ChromaStore(collection_name="test_two", persist_dir=data_dir)
+        item = first.add(content="Buy milk", metadata={"type": "task"})
+        second.add(content="Call mom")
+        first.update(item.id, content="Buy oat milk")
+        first.upsert("fixed-id", content="Pay rent")
+        first.query(text="milk")
+        second.nearest("mom")
+        first.embed("rent")
+
+        assert len(constructed) == 1
+
+    def test_stores_share_one_client_per_directory(self, tmp_path):
+        first = ChromaStore(collection_name="test_one", persist_dir=str(tmp_path))
+        second = ChromaStore(collection_name="test_two", persist_dir=str(tmp_path))
+        assert first._client is second._client
+
+    def test_batched_adds_written_on_exit(self, store, raw_docs):
+        with store:
+            first = store.add(content="First", metadata={"type": "task"})
+            second = store.add(content="Second", metadata={"type": "task"})
+            # Queued, not yet written
+            assert store._collection.count() == 0
+
+        assert raw_docs([first.id, second.id]).keys() == {first.id, second.id}
+
+    def test_add_rejects_invalid_metadata_immediately(self, store):
+        with store:
+            kept = store.add(content="Valid", metadata={"type": "task"})
+            with pytest.raises(ValueError):
+                store.add(content="Invalid", metadata={"tags": {"a": 1}})
+
+        assert store.get(kept.id).content == "Valid"
+        assert store._collection.count() == 1
+
+    def test_rejected_batch_retried_item_by_item(self, store, monkeypatch):
+        original_add = store._collection.add
+
+        def add_one_at_a_time(**kwargs):
+            if len(kwargs["ids"]) > 1:
+                raise ValueError("batch rejected")
+            original_add(**kwargs)
+
+        monkeypatch.setattr(store._collection, "add", add_one_at_a_time)
+        with store:
+            first = store.add(content="First")
+            second = store.add(content="Second")
+
+        assert store.get(first.id) is not None
+        assert store.get(second.id) is not None
+
+    def test_failed_add_does_not_lose_the_rest_of_the_batch(self, store, monkeypatch):
+        original_add = store._collection.add
+        failing_ids = set()
+
+        def add(**kwargs):
+            if failing_ids & set(kwargs["ids"]):
+                raise ValueError("rejected")
+            original_add(**kwargs)
+
+        monkeypatch.setattr(store._collection, "add", add)
+        with pytest.raises(WriteError) as excinfo:
+            with store:
+                kept = store.add(content="Kept")
+                dropped = store.add(content="Dropped")
+                failing_ids.add(dropped.id)
+
+        assert excinfo.value.errors.keys() == {dropped.id}
+        assert store.get(kept.id) is not None
+        assert store.get(dropped.id) is None
+        assert store._pending == []
+
+    def test_batch_write_errors_raised_when_batch_exits(self, store, monkeypatch):
+        original_add = store._collection.add
+
+        def add(**kwargs):
+            if "Dropped" in kwargs["documents"]:
+                raise ValueError("rejected")
+            original_add(**kwargs)
+
+        monkeypatch.setattr(store._collection, "add", add)
+
+        with pytest.raises(WriteError) as excinfo:
+            with store:
+                dropped = store.add(content="Dropped")
+                # A read flushes the batch, but the failure waits for the exit
+                assert store.get(dropped.id) is None
+                kept = store.add(content="Kept")
+
+        assert excinfo.value.errors.keys() == {dropped.id}
+        assert store.get(kept.id) is not None
+
+    def test_batched_adds_visible_to_reads(self, store):
+        with store:
+            item = store.add(content="Queued item", metadata={"status": "active"})
+            retrieved = store.get(item.id)
+
+        assert retrieved.content == "Queued item"
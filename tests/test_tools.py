@@ -0,0 +1,99 @@
+"""Tests for tools module, focusing on tool argument validation and dispatch."""
+
+import pytest
+
+from agent_native_app.tools import TOOL_SCHEMAS, TOOL_VALIDATORS, _compile_validator, dispatch
+
+
+class TestCompileValidator:
+    """Tests for validators compiled from tool parameter schemas."""
+
+    @pytest.fixture
+    def validate(self):
+        """Compile a schema covering each supported feature."""
+        return _compile_validator({
+            "type": "object",
+            "properties": {
+                "content": {"type": "string"},
+                "line": {"type": "integer"},
+                "score": {"type": "number"},
+                "done": {"type": "boolean"},
+                "properties": {"type": "object"},
+                "tags": {"type": "array"},
+                "status": {"type": "string", "enum": ["open", "done"]},
+            },
+            "required": ["content"]
+        })
+
+    def test_valid_arguments(self, validate):
+        assert validate({
+            "content": "Buy milk",
+            "line": 3,
+            "score": 0.5,
+            "done": False,
+            "properties": {"type": "task"},
+            "tags": ["errand"],
+            "status": "open",
+        }) is None
+
+    def test_only_required_arguments(self, validate):
+        assert validate({"content": "Buy milk"}) is None
+
+    def test_missing_required_argument(self, validate):
+        assert validate({"line": 3}) == "Missing required argument: content"
+
+    def test_unexpected_argument(self, validate):
+        assert validate({"content": "Buy milk", "colour": "red"}) == "Unexpected argument: colour"
+
+    def test_type_mismatch(self, validate):
+        assert validate({"content": 42}) == "Argument content must be of type string"
+        assert validate({"content": "Buy milk", "line": "3"}) == "Argument line must be of type integer"
+        assert validate({"content": "Buy milk", "tags": "errand"}) == "Argument tags must be of type array"
+
+    def test_bool_is_not_an_integer(self, validate):
+        # JSON true is a Python int, but not a JSON Schema integer
+        assert validate({"content": "Buy milk", "line": True}) == "Argument line must be of type integer"
+        assert validate({"content": "Buy milk", "score": False}) == "Argument score must be of type number"
+
+    def test_integer_is_a_number(self, validate):
+        assert validate({"content": "Buy milk", "score": 2}) is None
+
+    def test_optional_argument_may_be_null(self, validate):
+        assert validate({"content": "Buy milk", "line": None, "status": None}) is None
+
+    def test_required_argument_may_not_be_null(self, validate):
+        assert validate({"content": None}) == "Argument content must be of type string"
+
+    def test_enum_value_outside_enum(self, validate):
+        assert validate({"content": "Buy milk", "status": "closed"}) == "Argument status must be one of: open, done"
+
+    def test_arguments_must_be_an_object(self, validate):
+        assert validate(["Buy milk"]) == "Arguments must be an object"
+        assert validate(None) == "Arguments must be an object"
+
+
+class TestToolValidators:
+    """Tests for the validators compiled from TOOL_SCHEMAS."""
+
+    def test_every_tool_has_a_validator(self):
+        assert set(TOOL_VALIDATORS) == {schema["function"]["name"] for schema in TOOL_SCHEMAS}
+
+    def test_create_item_requires_content(self):
+        assert TOOL_VALIDATORS["create_item"]({}) == "Missing required argument: content"
+
+
+class TestDispatch:
+    """Tests for dispatch, which rejects bad calls before running a tool."""
+
+    def test_unknown_tool(self):
+        assert dispatch("launch_rockets", {}) == {"error": "Unknown tool: launch_rockets"}
+
+    def test_invalid_arguments_not_passed_to_tool(self):
+        assert dispatch("create_item", {"content": ["Buy milk"]}) == {
+            "error": "Argument content must be of type string"
+        }
+
+    def test_missing_argument_not_passed_to_tool(self):
+        assert dispatch("create_item", {"properties": {"type": "task"}}) == {
+            "error": "Missing required argument: content"
+        }